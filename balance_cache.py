@@ -0,0 +1,108 @@
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func
+
+from chains import CHAINS
+from config import BALANCE_HEARTBEAT_HOURS
+from db.models import Session, Balance
+
+# Последний известный снимок каждого кошелька: wallet_id -> (raw, amount, price),
+# raw — целое число базовых единиц сети, по нему и ищутся изменения.
+# Прогревается из БД один раз, дальше обновляется циклом проверки — поиск изменений
+# не зависит от размера истории в таблице balance.
+_last_balances: dict[int, tuple[int, float, float]] = {}
+# Когда кошельку последний раз записывался снимок (время time_check)
+_last_written: dict[int, datetime] = {}
+# Снимки до перехода на базовые единицы: raw восстановлен из float и точен лишь
+# до округления (для ETH почти никогда не совпадает с wei) — wallet_id -> coin
+_approximate: dict[int, str] = {}
+_warmed = False
+
+
+async def warm_balance_cache() -> None:
+    """Загружает последний снимок каждого кошелька одним сгруппированным запросом."""
+    global _warmed
+    if _warmed:
+        return
+
+    latest = (
+        select(func.max(Balance.id).label("id"))
+        .group_by(Balance.wallet_id)
+        .subquery()
+    )
+    async with Session() as session:
+        result = await session.execute(
+            select(
+                Balance.wallet_id, Balance.coin, Balance.amount, Balance.amount_raw,
+                Balance.price, Balance.time_check,
+            )
+            .join(latest, Balance.id == latest.c.id)
+        )
+        rows = result.all()
+
+    _last_balances.clear()
+    _last_written.clear()
+    _approximate.clear()
+    for wallet_id, coin, amount, amount_raw, price, time_check in rows:
+        # Снимки до перехода на базовые единицы хранят только количество монет
+        if amount_raw is None and coin in CHAINS:
+            amount_raw = CHAINS[coin].to_raw(amount)
+            _approximate[wallet_id] = coin
+        _last_balances[wallet_id] = (amount_raw, amount, price)
+        if time_check is not None:
+            _last_written[wallet_id] = time_check
+    _warmed = True
+
+
+def get_last_balance(wallet_id: int) -> Optional[tuple[int, float, float]]:
+    """Последний снимок (raw, amount, price) кошелька или None, если снимков ещё не было."""
+    return _last_balances.get(wallet_id)
+
+
+def balance_changed(wallet_id: int, raw: int) -> bool:
+    """
+    Отличается ли баланс raw от последнего снимка (нет снимка — тоже изменение).
+    Для снимка, восстановленного из количества монет, баланс считается прежним, если
+    в монетах он совпадает с записанным, — иначе ошибка округления стала бы движением.
+    """
+    previous = _last_balances.get(wallet_id)
+    if previous is None:
+        return True
+    if previous[0] == raw:
+        return False
+    coin = _approximate.get(wallet_id)
+    if coin is None:
+        return True
+    # Старые записи считались делением с float — допускаем расхождение в последних битах
+    return not math.isclose(CHAINS[coin].to_amount(raw), previous[1], rel_tol=1e-15, abs_tol=0.0)
+
+
+def snapshot_due(wallet_id: int, raw: int, now: datetime) -> bool:
+    """
+    Нужно ли писать снимок в balance: только при изменении баланса или если последний
+    снимок старше BALANCE_HEARTBEAT_HOURS (подтверждение, что кошелек проверяется).
+    """
+    if balance_changed(wallet_id, raw):
+        return True
+    written = _last_written.get(wallet_id)
+    return written is None or now - written >= timedelta(hours=BALANCE_HEARTBEAT_HOURS)
+
+
+def update_last_balance(
+    wallet_id: int, raw: int, amount: float, price: float, written_at: Optional[datetime] = None
+) -> None:
+    """Запоминает баланс последней проверки; written_at — время снимка, если он записан в balance."""
+    _last_balances[wallet_id] = (raw, amount, price)
+    # Точный raw от провайдера заменяет восстановленный из float
+    _approximate.pop(wallet_id, None)
+    if written_at is not None:
+        _last_written[wallet_id] = written_at
+
+
+def forget_wallet(wallet_id: int) -> None:
+    """Убирает удаленный кошелек, чтобы новый кошелек с тем же id начал с чистого листа."""
+    _last_balances.pop(wallet_id, None)
+    _last_written.pop(wallet_id, None)
+    _approximate.pop(wallet_id, None)
@@ -1,352 +1,410 @@
 import asyncio
-from datetime import datetime, timedelta
-from pprint import pprint
-
-import requests
-from sqlalchemy import select, desc
-from db.models import Session, Wallet, Balance, User, CryptoFlow, Currency
-from bot import bot, notify_signal
-from config import ADMIN_IDS, ETH_TOKEN, COINGECKO_DEMO_API_KEY
-from handlers import get_admin_keyboard
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, insert, update, bindparam
+from db.models import Session, WriteSession, Wallet, Balance, User, CryptoFlow
+from balance_cache import (
+    warm_balance_cache,
+    get_last_balance,
+    update_last_balance,
+    snapshot_due,
+    balance_changed,
+)
+from bot import notify_signal
+from chains import CHAINS, ChainBackend, BatchRejectedError
+from outbox import enqueue_broadcast
+from config import ADMIN_IDS, SCHEDULER_WORKERS, REPORT_INTERVAL, TX_CURSOR_CHAINS
+from metrics import CHECK_PHASE, WALLETS_CHECKED, WALLETS_SKIPPED
+from poll_schedule import (
+    warm_poll_schedule,
+    record_flow,
+    sync_wallets,
+    scheduled_wallets,
+    take_due_wallets,
+    reschedule_wallets,
+    seconds_until_due,
+)
+from price_cache import get_prices
+from price_history import price_at
+from stats import add_flows_to_rollup
+
+
+async def fetch_batch(backend: ChainBackend, addresses: list[str], currency: float) -> dict[str, tuple]:
+    """
+    Одна пачка адресов сети; лимиты, переключение и хеджирование между провайдерами —
+    внутри backend.fetch_many. Если провайдер отверг пачку целиком (BatchRejectedError),
+    она делится пополам, чтобы остальные адреса всё равно получили баланс; прочие
+    ошибки пропускают пачку до следующего цикла.
+    """
+    try:
+        return await backend.fetch_many(addresses, currency)
 
+    except Exception as e:
+        if len(addresses) > 1 and isinstance(e, BatchRejectedError):
+            middle = len(addresses) // 2
+            left, right = await asyncio.gather(
+                fetch_batch(backend, addresses[:middle], currency),
+                fetch_batch(backend, addresses[middle:], currency),
+            )
+            return {**left, **right}
 
-COINGECKO_SIMPLE_PRICE = "https://api.coingecko.com/api/v3/simple/price"
+        shown = addresses[0] if len(addresses) == 1 else f"{len(addresses)} адресов"
+        print(f"Ошибка при получении баланса {backend.label}: {e}")
+        # Текст сигнала постоянный, ошибка — в detail: иначе разные ответы API не склеиваются в одну сводку
+        await notify_signal(f"Ошибка при получении баланса {backend.label}", detail=f"{shown}: {e}")
+        return {}
 
 
-def fetch_coingecko_usd_prices(gecko_ids: tuple[str, ...]) -> dict[str, float]:
+async def fetch_all_balances(wallets, currencies: dict[str, float]) -> dict[int, tuple]:
     """
-    Один запрос CoinGecko simple/price для всех id (меньше риск 429, чем по одной монете).
-    Ключи результата — те же id, что в CoinGecko (bitcoin, tether, ...).
+    Балансы всех кошельков по wallet.id: адреса каждой сети запрашиваются пачками
+    по batch_size её backend (1 — запрос на кошелек), все сети параллельно.
+    Кошельки с ошибкой или неизвестной сетью в результат не попадают.
     """
-    unique_ids = tuple(dict.fromkeys(gecko_ids))
-    if not unique_ids:
-        return {}
-
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "CryptoChecker/1.0",
-    }
-    if COINGECKO_DEMO_API_KEY:
-        headers["x-cg-demo-api-key"] = COINGECKO_DEMO_API_KEY
-
-    params = {
-        "ids": ",".join(unique_ids),
-        "vs_currencies": "usd",
+    by_token: dict[str, list] = {}
+    for wallet in wallets:
+        if wallet.token in CHAINS:
+            by_token.setdefault(wallet.token, []).append(wallet)
+
+    job_tokens = []
+    jobs = []
+    for token, token_wallets in by_token.items():
+        backend = CHAINS[token]
+        addresses = [wallet.address for wallet in token_wallets]
+        for i in range(0, len(addresses), backend.batch_size):
+            job_tokens.append(token)
+            jobs.append(fetch_batch(backend, addresses[i:i + backend.batch_size], currencies[token]))
+
+    by_address: dict[tuple[str, str], tuple] = {}
+    for token, batch in zip(job_tokens, await asyncio.gather(*jobs)):
+        for address, result in batch.items():
+            by_address[(token, address)] = result
+
+    return {
+        wallet.id: by_address[(wallet.token, wallet.address)]
+        for wallet in wallets
+        if (wallet.token, wallet.address) in by_address
     }
 
-    try:
-        response = requests.get(
-            COINGECKO_SIMPLE_PRICE,
-            params=params,
-            headers=headers,
-            timeout=25,
-        )
-        if response.status_code != 200:
-            print(f"CoinGecko HTTP {response.status_code}: {response.text[:500]}")
-            return {}
-        data = response.json()
-        if not isinstance(data, dict):
-            print(f"CoinGecko: неожиданный ответ {data!r}")
-            return {}
-        if "error" in data or (
-            isinstance(data.get("status"), dict) and data["status"].get("error_code")
-        ):
-            print(f"CoinGecko API error: {data}")
-            return {}
-
-        out: dict[str, float] = {}
-        for gid in unique_ids:
-            block = data.get(gid)
-            if isinstance(block, dict) and block.get("usd") is not None:
-                out[gid] = float(block["usd"])
-        return out
-    except (requests.RequestException, TypeError, ValueError) as e:
-        print(f"CoinGecko: {e}")
-        return {}
-
-
-async def get_balance_btc(address, currency):
-    url = f"https://blockchain.info/balance?active={address}"
 
+async def fetch_transfers(wallet) -> Optional[tuple[list[tuple], str]]:
+    """Переводы кошелька после его курсора; None — ошибка (курсор не двигается до следующей проверки)."""
+    backend = CHAINS[wallet.token]
     try:
-        response = requests.get(url)
-        data = response.json()
-
-        # Проверяем наличие данных об адресе
-        if address not in data:
-            pprint(data)
-            print(f"Адрес не найден или ошибка в ответе API - {address}")
-            await notify_signal( f"Адрес не найден или ошибка в ответе API BTC - {address}")
-            return None, None, None
-
-        balance_satoshi = data[address]['final_balance']
-        # Конвертируем в BTC (1 BTC = 100,000,000 сатоши)
-        balance_btc = balance_satoshi / 100000000
-        price = currency * balance_btc
-
-        return balance_btc, 'btc', price
-
+        return await backend.fetch_transfers(wallet.address, wallet.tx_cursor)
     except Exception as e:
-        print(f"Ошибка при получении баланса BTC: {e}")
-        await notify_signal( f"{address} - Ошибка при получении баланса BTC: {e}")
-        return None, None, None
+        print(f"Ошибка при получении транзакций {backend.label}: {e}")
+        await notify_signal(f"Ошибка при получении транзакций {backend.label}", detail=f"{wallet.address}: {e}")
+        return None
 
 
-async def get_balance_ton(address, currency):
-    url = f"https://toncenter.com/api/v2/getAddressInformation?address={address}"
+def uses_tx_cursor(wallet) -> bool:
+    backend = CHAINS.get(wallet.token)
+    return wallet.token in TX_CURSOR_CHAINS and backend is not None and backend.supports_transfers
 
-    try:
-        response = requests.get(url)
-        data = response.json()
 
-        balance_nano = int(data['result']['balance'])
-        # Конвертируем в TON (1 TON = 1e9 нанотон)
-        balance_ton = balance_nano / 1e9
-        price = currency * balance_ton  # Используем корректный ID для TON
+# Итоги с момента последней сводки: были ли изменения, сумма поступлений и выводов в USD
+_pending = {"changes": False, "inflow": 0.0, "outflow": 0.0}
 
-        return balance_ton, 'ton', price
 
-    except Exception as e:
-        print(f"Ошибка при получении баланса TON: {e}")
-        await notify_signal( f"{address} - Ошибка при получении баланса TON: {e}")
-        return None, None, None
+async def check_wallets(wallets, currencies: dict[str, float]) -> None:
+    """
+    Запрашивает балансы кошельков и одной транзакцией записывает снимки и изменения.
+    Предыдущий снимок берется из кэша, без запросов к истории balance; изменения
+    копятся в _pending до следующей сводки.
 
+    Снимок в balance пишется только при изменении баланса и раз в BALANCE_HEARTBEAT_HOURS,
+    время каждой проверки — в wallet.last_checked_at.
 
-async def get_balance_eth(address, currency):
-    url = f"https://api.etherscan.io/v2/api?chainid=1&module=account&action=balance&address={address}&tag=latest&apikey={ETH_TOKEN}"
+    Для сетей из TX_CURSOR_CHAINS изменения — это переводы после wallet.tx_cursor,
+    каждый своей записью CryptoFlow, а баланс запрашивается и пишется, только если
+    переводы были (или снимка ещё нет).
+    """
+    await warm_balance_cache()
+    await warm_poll_schedule()
+
+    cursor_wallets = [wallet for wallet in wallets if uses_tx_cursor(wallet)]
+    with CHECK_PHASE.time(phase="transfers"):
+        cursor_results = await asyncio.gather(*(fetch_transfers(wallet) for wallet in cursor_wallets))
+    transfers = {
+        wallet.id: result for wallet, result in zip(cursor_wallets, cursor_results) if result is not None
+    }
 
-    try:
-        response = requests.get(url)
-        data = response.json()
+    balance_wallets = [
+        wallet for wallet in wallets
+        if not uses_tx_cursor(wallet) or (
+            wallet.id in transfers
+            and (transfers[wallet.id][0] or wallet.tx_cursor is None or get_last_balance(wallet.id) is None)
+        )
+    ]
+
+    # Все сети опрашиваются параллельно, каждая — в пределах лимитов своего провайдера
+    with CHECK_PHASE.time(phase="fetch"):
+        fetched = await fetch_all_balances(balance_wallets, currencies)
+
+    # Переводы с курсора идут со временем сети — оцениваем их по курсу на тот момент
+    # из price_history, а не по текущему: иначе после простоя в потоки попадает движение курса
+    tokens = {wallet.id: wallet.token for wallet in wallets}
+    moments = {
+        (tokens[wallet_id], moment)
+        for wallet_id, (wallet_transfers, _) in transfers.items()
+        for _, _, moment in wallet_transfers
+    }
+    historical: dict[tuple[str, datetime], Optional[float]] = {}
+    if moments:
+        async with Session() as session:
+            for coin, moment in moments:
+                historical[(coin, moment)] = await price_at(session, coin, moment)
+
+    time_check = datetime.now()
+    flow_time = datetime.utcnow()
+    balance_rows = []
+    flow_rows = []
+    cursor_rows = []
+    checked_rows = []
+    checked_balances = []
+    # Новые кошельки без снимка — повод для сводки; в _pending попадает только после коммита
+    new_snapshots = False
+
+    def add_flow(wallet, delta_raw: int, moment: datetime, usd: Optional[float] = None,
+                 tx_id: Optional[str] = None) -> None:
+        # Изменение считается в базовых единицах точно, в монеты переводится только для записи
+        delta = CHAINS[wallet.token].to_amount(delta_raw)
+        # Стоимость по курсу на момент изменения (usd; без него — текущий), а не разница
+        # стоимостей снимков: иначе в поступления и выводы попадает движение курса
+        delta_price = delta * (usd if usd is not None else currencies[wallet.token])
+
+        # Записываем изменение в CryptoFlow
+        flow_rows.append({
+            "wallet_id": wallet.id,
+            "amount": delta,
+            "amount_raw": delta_raw,
+            "coin": wallet.token,
+            "price": delta_price,
+            "time_created": moment,
+            "tx_id": tx_id,
+        })
+
+    for wallet in wallets:
+        if wallet.id in transfers:
+            # Снимок нужен, но не получен — переводы повторятся с того же курсора
+            if wallet in balance_wallets and wallet.id not in fetched:
+                continue
+            wallet_transfers, cursor = transfers[wallet.id]
+            for tx_id, raw, moment in wallet_transfers:
+                add_flow(wallet, raw, moment, historical.get((wallet.token, moment)), tx_id)
+            if cursor != wallet.tx_cursor:
+                cursor_rows.append({"id": wallet.id, "tx_cursor": cursor})
+            if wallet.id not in fetched:
+                # Переводов нет — кошелек проверен без запроса баланса
+                checked_rows.append({"id": wallet.id, "last_checked_at": flow_time})
+
+        if wallet.id not in fetched:
+            continue
+        raw, amount, price = fetched[wallet.id]
+        checked_rows.append({"id": wallet.id, "last_checked_at": flow_time})
+
+        # Неизменный баланс не пишется каждую проверку — только раз в BALANCE_HEARTBEAT_HOURS
+        written = snapshot_due(wallet.id, raw, time_check)
+        checked_balances.append((wallet.id, raw, amount, price, time_check if written else None))
+        if written:
+            balance_rows.append({
+                "wallet_id": wallet.id,
+                "coin": wallet.token,
+                "amount": amount,
+                "amount_raw": raw,
+                "price": price,
+                "time_check": time_check,
+            })
+
+        # Проверяем изменение баланса относительно предыдущего снимка
+        previous = get_last_balance(wallet.id)
+
+        if previous is None:
+            new_snapshots = True
+        elif wallet.id not in transfers and balance_changed(wallet.id, raw):
+            add_flow(wallet, raw - previous[0], flow_time)
+
+    with CHECK_PHASE.time(phase="persist"):
+        async with WriteSession() as session:
+            # Кошелек могли удалить, пока шел запрос к API: удаление идет через то же
+            # соединение записи, поэтому проверка в этой транзакции не разойдется с ним
+            checked = {wallet.id for wallet in wallets}
+            existing = set((await session.execute(
+                select(Wallet.id).where(Wallet.id.in_(checked))
+            )).scalars())
+            if existing != checked:
+                balance_rows = [row for row in balance_rows if row["wallet_id"] in existing]
+                flow_rows = [row for row in flow_rows if row["wallet_id"] in existing]
+                cursor_rows = [row for row in cursor_rows if row["id"] in existing]
+                checked_rows = [row for row in checked_rows if row["id"] in existing]
+                checked_balances = [item for item in checked_balances if item[0] in existing]
+
+            # Переводы, уже записанные прошлой проверкой (например, с устаревшим курсором),
+            # не пишутся повторно и не попадают в суточные итоги
+            tx_ids = {row["tx_id"] for row in flow_rows if row["tx_id"] is not None}
+            if tx_ids:
+                seen = set((await session.execute(
+                    select(CryptoFlow.wallet_id, CryptoFlow.tx_id).where(CryptoFlow.tx_id.in_(tx_ids))
+                )).tuples())
+                unique_rows = []
+                for row in flow_rows:
+                    key = (row["wallet_id"], row["tx_id"])
+                    if row["tx_id"] is not None:
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    unique_rows.append(row)
+                flow_rows = unique_rows
+
+            if balance_rows:
+                await session.execute(insert(Balance), balance_rows)
+            if flow_rows:
+                await session.execute(insert(CryptoFlow), flow_rows)
+                # Суточные итоги для статистики — в той же транзакции
+                await add_flows_to_rollup(session, flow_rows)
+            # UPDATE через таблицу, а не ORM bulk update: тот сверяет число затронутых строк
+            # и падает на кошельке, удаленном между проверкой и записью
+            wallet_update = update(Wallet.__table__).where(Wallet.__table__.c.id == bindparam("wallet_id"))
+            for rows in (cursor_rows, checked_rows):
+                if rows:
+                    await session.execute(
+                        wallet_update,
+                        [{"wallet_id": row["id"], **{k: v for k, v in row.items() if k != "id"}} for row in rows],
+                    )
+            await session.commit()
 
-        if data['status'] == '1' and data['message'] == 'OK':
-            balance_wei = int(data['result'])
-            # Конвертируем в ETH (1 ETH = 10^18 wei)
-            balance_eth = balance_wei / 10 ** 18
-            price = currency * balance_eth  # Используем ID Ethereum
+    # Итоги для сводки и «горячесть» кошельков — только после коммита: при ошибке записи
+    # кэш не обновлен, и то же изменение найдется при следующей проверке ещё раз
+    if new_snapshots or flow_rows:
+        _pending["changes"] = True
+    for row in flow_rows:
+        record_flow(row["wallet_id"], row["time_created"])
+        # Суммируем приток/отток
+        if row["amount"] > 0:
+            _pending["inflow"] += row["price"]
+        else:
+            _pending["outflow"] += abs(row["price"])
 
-            return balance_eth, 'eth', price
+    checked_ids = {row["id"] for row in checked_rows}
+    for wallet in wallets:
+        if wallet.id in checked_ids:
+            WALLETS_CHECKED.inc(chain=wallet.token)
         else:
-            print(f"Ошибка API Etherscan: {data['message']}")
-            await notify_signal( f"{address} - Ошибка API Etherscan: {data['message']}")
-            return None, None, None
+            WALLETS_SKIPPED.inc(chain=wallet.token)
 
-    except Exception as e:
-        print(f"Ошибка при получении баланса ETH: {e}")
-        await notify_signal( f"{address} - Ошибка при получении баланса ETH: {e}")
-        return None, None, None
+    for wallet_id, raw, amount, price, written_at in checked_balances:
+        update_last_balance(wallet_id, raw, amount, price, written_at)
+    by_id = {wallet.id: wallet for wallet in wallets}
+    for row in cursor_rows:
+        by_id[row["id"]].tx_cursor = row["tx_cursor"]
+    for row in checked_rows:
+        by_id[row["id"]].last_checked_at = row["last_checked_at"]
 
 
-async def get_balance_usdt_tron(address, currency):
-    # USDT contract address on TRON (для проверки в ответе)
-    usdt_contract_address = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+async def send_summary(wallets, currencies: dict[str, float]) -> None:
+    """
+    Сводка по всем кошелькам, если с прошлой сводки были изменения: последний
+    известный баланс каждого кошелька по текущему курсу и накопленные поступления и выводы.
+    """
+    if not _pending["changes"]:
+        return
+    with CHECK_PHASE.time(phase="notify"):
+        await _send_summary(wallets, currencies)
 
-    # API endpoint для получения информации об аккаунте
-    url = f"https://apilist.tronscanapi.com/api/account?address={address}"
 
-    try:
-        response = requests.get(url)
-        data = response.json()
+async def _send_summary(wallets, currencies: dict[str, float]) -> None:
+    total_inflow = _pending["inflow"]
+    total_outflow = _pending["outflow"]
+    _pending.update(changes=False, inflow=0.0, outflow=0.0)
 
-        # Проверяем наличие данных об аккаунте
-        if 'trc20token_balances' not in data:
-            return 0, 'usdt', 0
+    message = ""
+    total_balance = 0.0
+    for token, backend in CHAINS.items():
+        lines = []
+        for wallet in wallets:
+            previous = get_last_balance(wallet.id)
+            if wallet.token != token or previous is None:
+                continue
+            amount = previous[1]
+            total_balance += amount * currencies.get(token, 0.0)
+            lines.append(f"{wallet.address} - {amount} {backend.coin}\n")
+        if lines:
+            message += f"{token}\n" + "".join(lines) + "\n"
 
-        # Ищем USDT среди TRC20 токенов
-        usdt_balance = 0
-        for token in data['trc20token_balances']:
-            if token['tokenId'] == usdt_contract_address:
-                # Получаем баланс с учетом decimals
-                usdt_balance = float(token['balance']) / (10 ** token['tokenDecimal'])
-                break
+    message += f"Общий баланс в USD - {total_balance:.2f} $\n"
 
-        # Получаем цену USDT
-        price = currency * usdt_balance
+    if total_inflow > 0:
+        message += f"Поступление - {total_inflow:.2f} $\n"
+    if total_outflow > 0:
+        message += f"Вывод - {total_outflow:.2f} $\n"
 
-        return usdt_balance, 'usdt', price
+    async with Session() as session:
+        result = await session.execute(select(User.user_id).where(User.is_active == True))
+        active_user_ids = result.scalars().all()
 
-    except Exception as e:
-        print(f"Ошибка при получении баланса USDT-TRON: {e}")
-        await notify_signal( f"{address} - Ошибка при получении баланса USDT-TRON: {e}")
-        return None, None, None
+    # Админам — с клавиатурой; пользователь, он же админ, получает одно сообщение.
+    # Отчет уходит в очередь, отправляет его фоновый outbox_worker
+    recipients = {user_id: False for user_id in active_user_ids}
+    recipients.update({admin_id: True for admin_id in ADMIN_IDS})
+    await enqueue_broadcast(message, recipients)
 
 
-async def check_balances():
+async def load_wallets():
     async with Session() as session:
-        time_check = datetime.now()
-        await asyncio.sleep(5)
         result = await session.execute(select(Wallet))
-        wallets = result.scalars().all()
-
-        changes_detected = False
-        balances_by_token = {
-            'btc': [],
-            'eth': [],
-            'ton': [],
-            'tron': []
-        }
-        total_balance = 0.0
-        total_inflow = 0.0  # Сумма поступлений
-        total_outflow = 0.0  # Сумма выводов
-
-        # Курсы: tron в БД = USDT на TRC-20 → в CoinGecko id «tether» (не сеть Tron).
-        currency_mapping = {
-            "btc": "bitcoin",
-            "eth": "ethereum",
-            "ton": "the-open-network",
-            "tron": "tether",
-        }
-
-        gecko_prices = fetch_coingecko_usd_prices(tuple(currency_mapping.values()))
-        await asyncio.sleep(1)
-
-        currencies = {}
-        for coin_name, gecko_id in currency_mapping.items():
-            price = gecko_prices.get(gecko_id)
-
-            if price is None and coin_name == "tron":
-                # Стейблкоин ~ 1 USD; при лимитах CoinGecko не спамим алертом
-                price = 1.0
-                print("CoinGecko: нет цены tether — для tron (USDT) используем 1.0 USD")
-
-            async with Session() as temp_session:
-                if price is not None:
-                    result = await temp_session.execute(
-                        select(Currency).where(Currency.coin == coin_name)
-                    )
-                    currency_record = result.scalar_one_or_none()
-
-                    if currency_record:
-                        currency_record.currency = price
-                    else:
-                        currency_record = Currency(coin=coin_name, currency=price)
-                        temp_session.add(currency_record)
-
-                    await temp_session.commit()
-                    currencies[coin_name] = price
-                else:
-                    await notify_signal(f"Ошибка при получении курса {coin_name}")
-                    result = await temp_session.execute(
-                        select(Currency.currency).where(Currency.coin == coin_name)
-                    )
-                    last_currency = result.scalar_one_or_none()
-                    currencies[coin_name] = last_currency if last_currency else 0.0
+        return result.scalars().all()
 
-        currency_btc = currencies['btc']
-        currency_eth = currencies['eth']
-        currency_ton = currencies['ton']
-        currency_tron = currencies['tron']
 
-        for wallet in wallets:
-            await asyncio.sleep(3)
-            if wallet.token == 'btc':
-                amount, coin, price = await get_balance_btc(wallet.address, currency_btc)
-                if amount is None:
-                    continue
-            elif wallet.token == 'eth':
-                amount, coin, price = await get_balance_eth(wallet.address, currency_eth)
-                if amount is None:
-                    continue
-            elif wallet.token == 'ton':
-                amount, coin, price = await get_balance_ton(wallet.address, currency_ton)
-                if amount is None:
-                    continue
-            elif wallet.token == 'tron':
-                amount, coin, price = await get_balance_usdt_tron(wallet.address, currency_tron)
-                if amount is None:
-                    continue
-            else:
-                continue
+async def check_balances():
+    """Разовая проверка всех кошельков со сводкой (без планировщика)."""
+    wallets = await load_wallets()
 
-            balances_by_token[wallet.token].append((wallet.address, amount, price))
-            total_balance += price
+    # Курсы из кэша: устаревшие обновляются в фоне, цикл не ждет CoinGecko
+    with CHECK_PHASE.time(phase="prices"):
+        currencies = await get_prices()
+    await check_wallets(wallets, currencies)
+    await send_summary(wallets, currencies)
 
-            # Сохраняем новый баланс
-            balance = Balance(
-                wallet_id=wallet.id,
-                coin=wallet.token,
-                amount=amount,
-                price=price,
-                time_check=time_check
-            )
-            session.add(balance)
-            await session.commit()
 
-            # Проверяем изменение баланса
-            last_balance = await session.execute(
-                select(Balance)
-                .where(Balance.wallet_id == wallet.id)
-                .order_by(desc(Balance.time_check))
-                .limit(2)
-            )
-            balances = last_balance.scalars().all()
-
-            if len(balances) > 1 and balances[0].amount != balances[1].amount:
-                changes_detected = True
-                # Вычисляем изменение баланса
-                delta = balances[0].amount - balances[1].amount
-                delta_price = balances[0].price - balances[1].price
-
-                # Записываем изменение в CryptoFlow
-                flow = CryptoFlow(
-                    wallet_id=wallet.id,
-                    amount=delta,
-                    coin=wallet.token,
-                    price=delta_price
-                )
-                session.add(flow)
-
-                # Суммируем приток/отток
-                if delta > 0:
-                    total_inflow += delta_price
-                else:
-                    total_outflow += abs(delta_price)
-
-            elif len(balances) == 1:
-                changes_detected = True
-
-        await session.commit()
-
-        if changes_detected:
-            message = ""
-            for token in ['btc', 'eth', 'ton', 'tron']:
-                if balances_by_token[token]:
-                    message += f"{token}\n"
-                    for address, amount, price in balances_by_token[token]:
-                        if token != 'tron':
-                            message += f"{address} - {amount} {token}\n"
-                        else:
-                            message += f"{address} - {amount} usdt\n"
-                    message += "\n"
-
-            message += f"Общий баланс в USD - {total_balance:.2f} $\n"
-
-            if total_inflow > 0:
-                message += f"Поступление - {total_inflow:.2f} $\n"
-            if total_outflow > 0:
-                message += f"Вывод - {total_outflow:.2f} $\n"
-
-            for admin_id in ADMIN_IDS:
-                await bot.send_message(admin_id, message, reply_markup=get_admin_keyboard())
-
-            result = await session.execute(select(User).where(User.is_active == True))
-            active_users = result.scalars().all()
-
-            for user in active_users:
-                try:
-                    await bot.send_message(user.user_id, message)
-                except:
-                    pass
-
-
-async def periodic_balance_check():
+async def balance_worker():
+    """Забирает кошельки с наступившим сроком проверки, проверяет и ставит в очередь снова."""
     while True:
-        start_time = datetime.now()
+        wallets = take_due_wallets()
+        if not wallets:
+            # Новые кошельки появляются при сверке со списком — спим не дольше секунды
+            delay = seconds_until_due()
+            await asyncio.sleep(min(delay if delay is not None else 1.0, 1.0))
+            continue
+
         try:
-            await check_balances()  # Основная задача
+            # Курсы из кэша: устаревшие обновляются в фоне, проверка не ждет CoinGecko
+            with CHECK_PHASE.time(phase="prices"):
+                currencies = await get_prices()
+            await check_wallets(wallets, currencies)
         except Exception as e:
-            await notify_signal( f"Общая ошибка: {e}")
-            await asyncio.sleep(300)
-        elapsed = datetime.now() - start_time  # Время выполнения задачи
-        wait_time = max(timedelta(minutes=5) - elapsed, timedelta(0))  # Ждём оставшееся время
-        await asyncio.sleep(wait_time.total_seconds())  # Ожидание до следующего цикла
\ No newline at end of file
+            await notify_signal("Общая ошибка", detail=str(e))
+
+        reschedule_wallets(wallets, datetime.utcnow())
+
+
+async def run_balance_scheduler():
+    """
+    Проверка балансов по расписанию каждого кошелька вместо общего цикла:
+    SCHEDULER_WORKERS задач разбирают очередь, а раз в REPORT_INTERVAL секунд
+    очередь сверяется с БД и уходит сводка, если были изменения.
+    """
+    sync_wallets(await load_wallets())
+    workers = [asyncio.create_task(balance_worker()) for _ in range(SCHEDULER_WORKERS)]
+    try:
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            try:
+                sync_wallets(await load_wallets())
+                await send_summary(scheduled_wallets(), await get_prices())
+            except Exception as e:
+                await notify_signal("Общая ошибка", detail=str(e))
+    finally:
+        for worker in workers:
+            worker.cancel()
@@ -0,0 +1,269 @@
+"""
+Бенчмарк полного цикла проверки балансов без обращения к внешним API.
+
+Запуск: python -m bench.bench_cycle [--wallets 200] [--runs 3] [--changes 0.1]
+        [--latency 0.05] [--error-rate 0.0] [--throttle-rate 0.0] [--rps 0]
+
+Поднимает локальный стенд, который отвечает в формате blockchain.info, mempool.space,
+blockstream.info, Etherscan, JSON-RPC Ethereum, toncenter, tonapi, tronscan, trongrid
+и CoinGecko, и направляет на него провайдеров через <PROVIDER>_URL и ETH_RPC_URL.
+Стенд отвечает с задержкой --latency (±50%), отдает HTTP 500 с долей --error-rate
+и 429 с Retry-After с долей --throttle-rate.
+
+Во временную базу записываются --wallets кошельков поровну по сетям. Затем --runs раз
+выполняется balance_checker.check_balances и отправка очереди сообщений; бот заглушен,
+в Telegram ничего не уходит. Перед каждым запуском, кроме первого, у доли --changes
+кошельков меняется баланс. По каждому запуску печатаются время цикла, запросы
+к стенду по провайдерам и записи в БД (изменяющие запросы и строки).
+
+Лимиты провайдеров берутся из конфигурации как в продакшене; --rps N задает всем
+провайдерам N запросов/с и N одновременных, чтобы измерять код, а не лимиты.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from aiohttp import web
+
+PROVIDERS = (
+    "blockchain_info", "mempool_space", "blockstream", "etherscan", "eth_rpc",
+    "toncenter", "tonapi", "tronscan", "trongrid", "coingecko",
+)
+USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+GECKO_PRICES = {"bitcoin": 65000.0, "ethereum": 3200.0, "the-open-network": 5.5, "tether": 1.0}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wallets", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--changes", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rps", type=float, default=0.0)
+    return parser.parse_args()
+
+
+class MockApi:
+    """Локальный стенд API: балансы адресов в базовых единицах и счетчики запросов."""
+
+    def __init__(self, latency: float, error_rate: float, throttle_rate: float):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(42)
+        self.balances: dict[str, int] = {}
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+
+    def balance(self, address: str) -> int:
+        if address not in self.balances:
+            digest = hashlib.sha256(address.encode()).digest()
+            self.balances[address] = int.from_bytes(digest[:6], "big")
+        return self.balances[address]
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        provider = request.path.strip("/").split("/")[0]
+        self.requests[provider] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.injected["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            self.injected["500"] += 1
+            return web.Response(status=500, text="mock error")
+        return await handler(request)
+
+    async def blockchain_info(self, request):
+        addresses = request.query["active"].split("|")
+        return web.json_response({
+            address: {"final_balance": self.balance(address), "n_tx": 1, "total_received": self.balance(address)}
+            for address in addresses
+        })
+
+    async def esplora(self, request):
+        address = request.match_info["address"]
+        return web.json_response({
+            "address": address,
+            "chain_stats": {"funded_txo_sum": self.balance(address), "spent_txo_sum": 0},
+        })
+
+    async def etherscan(self, request):
+        addresses = request.query["address"].split(",")
+        return web.json_response({
+            "status": "1",
+            "message": "OK",
+            "result": [{"account": address, "balance": str(self.balance(address))} for address in addresses],
+        })
+
+    async def eth_rpc(self, request):
+        payload = await request.json()
+        return web.json_response([
+            {"jsonrpc": "2.0", "id": item["id"], "result": hex(self.balance(item["params"][0]))}
+            for item in payload
+        ])
+
+    async def toncenter_address(self, request):
+        return web.json_response({"ok": True, "result": {"balance": str(self.balance(request.query["address"]))}})
+
+    async def toncenter_transactions(self, request):
+        return web.json_response({"ok": True, "result": []})
+
+    async def tonapi(self, request):
+        return web.json_response({"balance": self.balance(request.match_info["address"])})
+
+    async def tronscan(self, request):
+        address = request.query["address"]
+        return web.json_response({"trc20token_balances": [
+            {"tokenId": USDT_CONTRACT, "balance": str(self.balance(address)), "tokenDecimal": 6},
+        ]})
+
+    async def trongrid_account(self, request):
+        address = request.match_info["address"]
+        return web.json_response({"success": True, "data": [{"trc20": [{USDT_CONTRACT: str(self.balance(address))}]}]})
+
+    async def trongrid_transactions(self, request):
+        return web.json_response({"success": True, "data": [], "meta": {}})
+
+    async def coingecko(self, request):
+        ids = request.query["ids"].split(",")
+        return web.json_response({gecko_id: {"usd": GECKO_PRICES[gecko_id]} for gecko_id in ids if gecko_id in GECKO_PRICES})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/blockchain_info/balance", self.blockchain_info)
+        app.router.add_get("/mempool_space/address/{address}", self.esplora)
+        app.router.add_get("/blockstream/address/{address}", self.esplora)
+        app.router.add_get("/etherscan/v2/api", self.etherscan)
+        app.router.add_post("/eth_rpc", self.eth_rpc)
+        app.router.add_get("/toncenter/api/v2/getAddressInformation", self.toncenter_address)
+        app.router.add_get("/toncenter/api/v2/getTransactions", self.toncenter_transactions)
+        app.router.add_get("/tonapi/v2/accounts/{address}", self.tonapi)
+        app.router.add_get("/tronscan/api/account", self.tronscan)
+        app.router.add_get("/trongrid/v1/accounts/{address}", self.trongrid_account)
+        app.router.add_get("/trongrid/v1/accounts/{address}/transactions/trc20", self.trongrid_transactions)
+        app.router.add_get("/coingecko/api/v3/simple/price", self.coingecko)
+        return app
+
+
+def make_address(token: str, rng: random.Random) -> str:
+    """Случайный адрес, проходящий проверку формата сети."""
+    if token == "btc":
+        return "1" + "".join(rng.choice(BASE58) for _ in range(33))
+    if token == "eth":
+        return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+    if token == "ton":
+        return "0:" + "".join(rng.choice("0123456789abcdef") for _ in range(64))
+    return "T" + "".join(rng.choice(BASE58) for _ in range(33))
+
+
+class WriteCounter:
+    """Изменяющие SQL-запросы и число затронутых строк на движке записи."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(" ", 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.statements += 1
+            self.rows += len(parameters) if executemany else 1
+
+
+async def main(args) -> None:
+    mock = MockApi(args.latency, args.error_rate, args.throttle_rate)
+    runner = web.AppRunner(mock.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    # Конфигурация читается при импорте — окружение задается до импорта модулей бота
+    for provider in PROVIDERS:
+        os.environ[f"{provider.upper()}_URL"] = f"{base}/{provider}"
+        if args.rps:
+            os.environ[f"{provider.upper()}_RPS"] = str(args.rps)
+            os.environ[f"{provider.upper()}_CONCURRENCY"] = str(max(1, int(args.rps)))
+    os.environ["ETH_RPC_URL"] = f"{base}/eth_rpc"
+
+    from sqlalchemy import event, insert
+    from balance_checker import check_balances
+    from bot import bot
+    from broadcast import flush_outbox
+    from chains import CHAINS
+    from db import models
+    from http_client import init_http_session, close_http_session
+
+    sent = Counter()
+
+    async def send_message(chat_id, text, **kwargs):
+        sent[chat_id] += 1
+
+    bot.send_message = send_message
+
+    writes = WriteCounter()
+    event.listen(models.write_engine.sync_engine, "before_cursor_execute", writes)
+
+    await models.create_tables()
+    rng = random.Random(7)
+    tokens = list(CHAINS)
+    wallets = [
+        {"address": make_address(tokens[i % len(tokens)], rng), "token": tokens[i % len(tokens)]}
+        for i in range(args.wallets)
+    ]
+    async with models.WriteSession() as session:
+        await session.execute(insert(models.Wallet), wallets)
+        await session.execute(insert(models.User), [{"user_id": 1000 + i, "is_active": True} for i in range(5)])
+        await session.commit()
+    print(f"Кошельков: {args.wallets} ({', '.join(tokens)}), стенд {base}\n")
+
+    await init_http_session()
+    try:
+        for run in range(1, args.runs + 1):
+            if run > 1:
+                for wallet in rng.sample(wallets, int(len(wallets) * args.changes)):
+                    mock.balances[wallet["address"]] = mock.balance(wallet["address"]) + rng.randint(1, 10 ** 6)
+            mock.requests.clear()
+            mock.injected.clear()
+            sent.clear()
+            writes.statements = writes.rows = 0
+
+            started = time.perf_counter()
+            await check_balances()
+            cycle = time.perf_counter() - started
+            while await flush_outbox():
+                pass
+            total = time.perf_counter() - started
+
+            requests = ", ".join(f"{name} {count}" for name, count in sorted(mock.requests.items()))
+            print(f"Запуск {run}: цикл {cycle:.2f} с, с отправкой очереди {total:.2f} с")
+            print(f"  запросы: {sum(mock.requests.values())} ({requests})")
+            if mock.injected:
+                print(f"  ошибки стенда: {dict(mock.injected)}")
+            print(f"  записи в БД: {writes.statements} запросов, {writes.rows} строк")
+            print(f"  сообщений боту: {sum(sent.values())}")
+    finally:
+        await close_http_session()
+        await runner.cleanup()
+        await models.engine.dispose()
+        await models.write_engine.dispose()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    os.environ.setdefault("TG_TOKEN", "123456:bench")
+    os.environ.setdefault("ADMIN_IDS", "1")
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ["RETENTION_ARCHIVE_DIR"] = os.path.join(directory, "archive")
+        asyncio.run(main(arguments))
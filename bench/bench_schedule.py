@@ -0,0 +1,86 @@
+"""
+Проверка пакетирования планировщика проверок на виртуальных часах.
+
+Запуск: python -m bench.bench_schedule [--wallets 200] [--hot 0.2] [--hours 24] [--min-batch 0.8]
+
+Ставит в очередь poll_schedule --wallets BTC-кошельков (доля --hot — с недавним движением,
+остальные — холодные) и --hours часов гоняет take_due_wallets и reschedule_wallets, как
+balance_worker, но без сети и БД: время подменяется виртуальным. Печатает число пачек,
+средний и минимальный размер пачки и завершается с кодом 1, если средняя пачка меньше
+--min-batch от идеальной (кошельки с одним интервалом — полными пачками по batch_size):
+значит, джиттер снова разнес кошельки по отдельным запросам.
+"""
+import argparse
+import os
+import math
+import statistics
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wallets", type=int, default=200)
+    parser.add_argument("--hot", type=float, default=0.2)
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--min-batch", type=float, default=0.8)
+    return parser.parse_args()
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def main(args) -> None:
+    import poll_schedule
+    from chains import CHAINS
+
+    clock = VirtualClock()
+    poll_schedule.time = SimpleNamespace(monotonic=clock.monotonic)
+    poll_schedule.POLL_INCREMENTAL = True
+
+    start = datetime.utcnow()
+    wallets = [SimpleNamespace(id=i, token="btc") for i in range(1, args.wallets + 1)]
+    for wallet in wallets[:int(args.wallets * args.hot)]:
+        poll_schedule.record_flow(wallet.id, start)
+    poll_schedule.sync_wallets(wallets)
+
+    batch_size = CHAINS["btc"].batch_size
+    # Идеальная средняя пачка: группы с одинаковым интервалом делятся на полные пачки,
+    # пачки группы повторяются раз в её интервал
+    groups = Counter(poll_schedule.poll_interval(wallet.id, None, start).total_seconds() for wallet in wallets)
+    ideal = sum(count / interval for interval, count in groups.items()) / sum(
+        math.ceil(count / batch_size) / interval for interval, count in groups.items()
+    )
+    end = args.hours * 3600
+    sizes = []
+    while clock.now < end:
+        batch = poll_schedule.take_due_wallets()
+        if not batch:
+            delay = poll_schedule.seconds_until_due()
+            clock.now += max(delay if delay is not None else 1.0, 0.001)
+            continue
+        sizes.append(len(batch))
+        poll_schedule.reschedule_wallets(batch, start + timedelta(seconds=clock.now))
+
+    average = statistics.mean(sizes)
+    print(
+        f"Пачек: {len(sizes)}, проверок: {sum(sizes)}, средняя пачка {average:.1f}, "
+        f"минимальная {min(sizes)}, идеальная {ideal:.1f}, batch_size {batch_size}"
+    )
+    if average < args.min_batch * ideal:
+        print(f"\nСредняя пачка меньше {args.min_batch:.0%} идеальной: кошельки не собираются в запросы")
+        sys.exit(1)
+    print("\nПакетирование в норме.")
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    os.environ.setdefault("TG_TOKEN", "123456:bench")
+    main(arguments)
@@ -0,0 +1,168 @@
+"""
+Микро-бенчмарк статистики поступлений на заполненной базе.
+
+Запуск: python -m bench.bench_stats [--flows 1000000] [--wallets 400] [--days 730] [--runs 5]
+
+Создает временную базу, записывает N случайных CryptoFlow за последние --days дней,
+строит flow_daily той же миграцией, что и create_tables, и сравнивает:
+  legacy   — пять отдельных SUM по crypto_flow, как show_stats до суточных итогов;
+  rollup   — пять отдельных SUM(inflow) по flow_daily;
+  combined — stats.flow_totals, один запрос: inflow и outflow по всем периодам.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", type=int, default=1_000_000)
+    parser.add_argument("--wallets", type=int, default=400)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--runs", type=int, default=5)
+    return parser.parse_args()
+
+
+def seed_flows(path: str, flows: int, wallets: int, days: int) -> None:
+    """Быстрая вставка CryptoFlow напрямую через sqlite3 в формате DateTime SQLAlchemy."""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    span = days * 24 * 3600
+    connection = sqlite3.connect(path)
+    batch = []
+    for _ in range(flows):
+        moment = now - timedelta(seconds=rng.randrange(span))
+        price = rng.uniform(-500, 500)
+        batch.append((
+            rng.randint(1, wallets),
+            price / 1000,
+            "btc",
+            price,
+            moment.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        ))
+        if len(batch) == 50_000:
+            connection.executemany(
+                "INSERT INTO crypto_flow (wallet_id, amount, coin, price, time_created) VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        connection.executemany(
+            "INSERT INTO crypto_flow (wallet_id, amount, coin, price, time_created) VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+    connection.commit()
+    connection.close()
+
+
+async def legacy_totals(session, CryptoFlow) -> list[float]:
+    from sqlalchemy import select, func
+
+    now = datetime.utcnow()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    week_start = (now - timedelta(days=now.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(hours=3)
+    first_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_start = first_of_month - timedelta(hours=3)
+    if first_of_month.month == 1:
+        prev_cal = datetime(first_of_month.year - 1, 12, 1)
+    else:
+        prev_cal = datetime(first_of_month.year, first_of_month.month - 1, 1)
+    prev_month_start = prev_cal - timedelta(hours=3)
+
+    queries = [
+        select(func.sum(CryptoFlow.price)).where(CryptoFlow.price > 0, CryptoFlow.time_created >= today_start),
+        select(func.sum(CryptoFlow.price)).where(CryptoFlow.price > 0, CryptoFlow.time_created >= week_start),
+        select(func.sum(CryptoFlow.price)).where(CryptoFlow.price > 0, CryptoFlow.time_created >= month_start),
+        select(func.sum(CryptoFlow.price)).where(
+            CryptoFlow.price > 0,
+            CryptoFlow.time_created >= prev_month_start,
+            CryptoFlow.time_created < month_start,
+        ),
+        select(func.sum(CryptoFlow.price)).where(CryptoFlow.price > 0),
+    ]
+    totals = []
+    for query in queries:
+        result = await session.execute(query)
+        totals.append(float(result.scalar() or 0))
+    return totals
+
+
+async def rollup_totals(session, FlowDaily) -> list[float]:
+    from sqlalchemy import select, func
+    from stats import period_bounds
+
+    totals = []
+    for start_day, end_day in period_bounds().values():
+        query = select(func.sum(FlowDaily.inflow))
+        if start_day is not None:
+            query = query.where(FlowDaily.day >= start_day)
+        if end_day is not None:
+            query = query.where(FlowDaily.day < end_day)
+        result = await session.execute(query)
+        totals.append(float(result.scalar() or 0))
+    return totals
+
+
+async def measure(label: str, runs: int, session_factory, func) -> list[float]:
+    timings = []
+    totals = []
+    for _ in range(runs):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            totals = await func(session)
+            timings.append(time.perf_counter() - started)
+    print(
+        f"{label:<9} median {statistics.median(timings) * 1000:9.2f} ms"
+        f"   min {min(timings) * 1000:9.2f} ms"
+    )
+    return totals
+
+
+async def main(args) -> None:
+    from db import models
+    from stats import flow_totals
+
+    await models.create_tables()
+    print(f"Заполнение: {args.flows} flows, {args.wallets} кошельков, {args.days} дней...")
+    started = time.perf_counter()
+    seed_flows(os.environ["BENCH_DB_PATH"], args.flows, args.wallets, args.days)
+    await models.create_tables()  # миграция строит flow_daily по crypto_flow
+    async with models.write_engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+    print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+    legacy = await measure("legacy", args.runs, models.Session, lambda s: legacy_totals(s, models.CryptoFlow))
+    rollup = await measure("rollup", args.runs, models.Session, lambda s: rollup_totals(s, models.FlowDaily))
+
+    async def combined_totals(session):
+        totals = await flow_totals(session)
+        return [inflow for inflow, _ in totals.values()]
+
+    combined = await measure("combined", args.runs, models.Session, combined_totals)
+
+    for name, values in (("rollup", rollup), ("combined", combined)):
+        if any(abs(a - b) > 1e-6 * max(1.0, abs(a)) for a, b in zip(legacy, values)):
+            print(f"\nРасхождение итогов legacy и {name}: {legacy} != {values}")
+            sys.exit(1)
+    print("\nИтоги всех вариантов совпадают.")
+
+    await models.engine.dispose()
+    await models.write_engine.dispose()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "bench.db")
+        os.environ["BENCH_DB_PATH"] = db_path
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{db_path}"
+        asyncio.run(main(arguments))
@@ -1,11 +1,15 @@
 from aiogram import Bot
-from config import TG_TOKEN, SIGNAL
+from config import TG_TOKEN
+from outbox import enqueue_signal
 from typing import Optional
 
 # Инициализация бота Telegram
 bot: Optional[Bot] = Bot(token=TG_TOKEN)
 
 
-async def notify_signal(text: str) -> None:
-    if SIGNAL is not None:
-        await bot.send_message(SIGNAL, text)
+async def notify_signal(text: str, detail: Optional[str] = None) -> None:
+    """
+    Служебный сигнал в чат SIGNAL. Не отправляется сразу, а ставится в очередь:
+    одинаковые сигналы (text) с разными detail (адресами) придут одной сводкой.
+    """
+    await enqueue_signal(text, detail)
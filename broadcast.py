@@ -0,0 +1,204 @@
+import asyncio
+import time
+from typing import Optional
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramForbiddenError,
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+from sqlalchemy import update
+
+from bot import bot
+from config import (
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_BATCH_SIZE,
+    TG_BROADCAST_CONCURRENCY,
+    TG_BROADCAST_RPS,
+    TG_PER_CHAT_INTERVAL,
+    TG_SEND_ATTEMPTS,
+)
+from db.models import WriteSession, User
+from handlers import get_admin_keyboard
+from metrics import BROADCAST_DURATION, OUTBOX_PENDING, TELEGRAM_MESSAGES
+from outbox import fetch_pending, complete, postpone, coalesce_signals
+from rate_limiter import RateLimiter
+
+# Общий лимит бота на все чаты
+_global_limiter = RateLimiter(TG_BROADCAST_CONCURRENCY, TG_BROADCAST_RPS)
+# Когда в чат можно писать снова: chat_id -> time.monotonic()
+_chat_next_send: dict[int, float] = {}
+# После RetryAfter Telegram ограничивает весь бот — пауза для всех отправок
+_paused_until = 0.0
+
+
+class BroadcastResult:
+    """Итог рассылки: доставлено, не доставлено и отключено (пользователь заблокировал бота)."""
+
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.deactivated = 0
+        self.retry_chat_ids: list[int] = []  # Ошибки отправки — можно повторить позже
+        self.unavailable_chat_ids: list[int] = []  # Из них: Telegram был недоступен
+
+    def __repr__(self) -> str:
+        return (
+            f"BroadcastResult(delivered={self.delivered}, failed={self.failed}, "
+            f"deactivated={self.deactivated})"
+        )
+
+
+async def _wait_chat_slot(chat_id: int) -> None:
+    now = time.monotonic()
+    ready_at = max(_chat_next_send.get(chat_id, 0.0), _paused_until)
+    _chat_next_send[chat_id] = max(now, ready_at) + TG_PER_CHAT_INTERVAL
+    if ready_at > now:
+        await asyncio.sleep(ready_at - now)
+
+
+async def send_with_limits(chat_id: int, text: str, reply_markup=None) -> Optional[str]:
+    """
+    Отправляет одно сообщение в пределах лимитов Telegram, повторяя после RetryAfter.
+    Возвращает None при успехе, "blocked" — бот заблокирован, "unavailable" — Telegram
+    недоступен (сеть, 5xx, RetryAfter на всех попытках), "failed" — прочие ошибки.
+    """
+    global _paused_until
+    for attempt in range(TG_SEND_ATTEMPTS):
+        await _wait_chat_slot(chat_id)
+        try:
+            async with _global_limiter:
+                await bot.send_message(chat_id, text, reply_markup=reply_markup)
+            return None
+        except TelegramRetryAfter as e:
+            _paused_until = max(_paused_until, time.monotonic() + e.retry_after)
+        except TelegramForbiddenError:
+            return "blocked"
+        except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+            print(f"Telegram недоступен, отправка в {chat_id} отложена: {e}")
+            return "unavailable"
+        except TelegramAPIError as e:
+            print(f"Ошибка отправки в {chat_id}: {e}")
+            return "failed"
+    return "unavailable"
+
+
+async def broadcast(text: str, recipients: dict[int, object]) -> BroadcastResult:
+    """
+    Параллельная рассылка текста: recipients — chat_id -> reply_markup (или None).
+    Пользователи, заблокировавшие бота, деактивируются одним запросом.
+    """
+    result = BroadcastResult()
+    chat_ids = list(recipients)
+    outcomes = await asyncio.gather(
+        *(send_with_limits(chat_id, text, recipients[chat_id]) for chat_id in chat_ids),
+        return_exceptions=True,
+    )
+
+    blocked = []
+    for chat_id, outcome in zip(chat_ids, outcomes):
+        if outcome is None:
+            result.delivered += 1
+        else:
+            result.failed += 1
+            if outcome == "blocked":
+                blocked.append(chat_id)
+            else:
+                result.retry_chat_ids.append(chat_id)
+                if outcome == "unavailable":
+                    result.unavailable_chat_ids.append(chat_id)
+                elif isinstance(outcome, BaseException):
+                    print(f"Ошибка отправки в {chat_id}: {outcome}")
+
+    if blocked:
+        async with WriteSession() as session:
+            deactivated = await session.execute(
+                update(User)
+                .where(User.user_id.in_(blocked), User.is_active == True)
+                .values(is_active=False)
+            )
+            await session.commit()
+        result.deactivated = deactivated.rowcount
+
+    return result
+
+
+async def flush_outbox() -> int:
+    """
+    Отправляет накопленную очередь: сигналы — сводками, отчеты — параллельной рассылкой.
+    Возвращает число обработанных строк очереди.
+    """
+    rows = await fetch_pending(OUTBOX_BATCH_SIZE)
+    OUTBOX_PENDING.set(len(rows))
+    if not rows:
+        return 0
+    with BROADCAST_DURATION.time():
+        return await _flush_rows(rows)
+
+
+async def _flush_rows(rows) -> int:
+
+    by_id = {row.id: row for row in rows}
+    done: list[int] = []
+    retry: list[int] = []
+    # Telegram недоступен — попытка не засчитывается, сообщение просто откладывается
+    unavailable: list[int] = []
+
+    signals = coalesce_signals([row for row in rows if row.kind == "signal"])
+    outcomes = await asyncio.gather(
+        *(send_with_limits(chat_id, text) for chat_id, text, _ in signals),
+        return_exceptions=True,
+    )
+    for (_, _, ids), outcome in zip(signals, outcomes):
+        if outcome is None or outcome == "blocked":
+            done.extend(ids)
+        elif outcome == "unavailable":
+            unavailable.extend(ids)
+        else:
+            retry.extend(ids)
+
+    # Отчеты группируются по тексту: одна рассылка на один отчет
+    reports: dict[str, list] = {}
+    for row in rows:
+        if row.kind == "message":
+            reports.setdefault(row.text, []).append(row)
+    keyboard = get_admin_keyboard()
+    for text, report_rows in reports.items():
+        recipients = {row.chat_id: keyboard if row.with_keyboard else None for row in report_rows}
+        delivery = await broadcast(text, recipients)
+        failed = set(delivery.retry_chat_ids)
+        down = set(delivery.unavailable_chat_ids)
+        for row in report_rows:
+            if row.chat_id in down:
+                unavailable.append(row.id)
+            elif row.chat_id in failed:
+                retry.append(row.id)
+            else:
+                done.append(row.id)
+        TELEGRAM_MESSAGES.inc(delivery.delivered, result="delivered")
+        TELEGRAM_MESSAGES.inc(delivery.failed, result="failed")
+        TELEGRAM_MESSAGES.inc(delivery.deactivated, result="deactivated")
+        print(
+            f"Рассылка: доставлено {delivery.delivered}, не доставлено {delivery.failed}, "
+            f"отключено {delivery.deactivated}"
+        )
+
+    await complete(done)
+    await postpone([by_id[row_id] for row_id in retry])
+    await postpone([by_id[row_id] for row_id in unavailable], counted=False)
+    return len(rows)
+
+
+async def outbox_worker() -> None:
+    """Фоновая отправка очереди: цикл проверки балансов никогда не ждет Telegram."""
+    while True:
+        try:
+            processed = await flush_outbox()
+        except Exception as e:
+            print(f"Ошибка отправки очереди сообщений: {e}")
+            processed = 0
+        # Полная пачка — сразу берем следующую, иначе даем сигналам накопиться в сводку
+        if processed < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
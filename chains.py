@@ -0,0 +1,643 @@
+import asyncio
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from bot import notify_signal
+from config import (
+    ETH_TOKEN,
+    ETH_RPC_URL,
+    API_BASE_URLS,
+    CHAIN_PROVIDERS,
+    BTC_BATCH_SIZE,
+    ETH_BATCH_SIZE,
+    PROVIDER_FAILURE_THRESHOLD,
+    PROVIDER_COOLDOWN,
+    HEDGE_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_DEFAULT_DELAY,
+    TX_PAGE_SIZE,
+)
+from http_client import get_http_session
+from rate_limiter import RateLimitedError, provider_limiter, raise_if_throttled
+
+
+class BatchRejectedError(Exception):
+    """Провайдер отверг пачку адресов целиком — обычно из-за одного некорректного адреса."""
+
+
+class ProvidersUnavailableError(Exception):
+    """Ни один провайдер сети не вернул балансы."""
+
+
+class ProviderHealth:
+    """Здоровье провайдера: ошибки подряд, пауза после серии сбоев и последние задержки."""
+
+    # Меньше замеров — перцентиль задержки ненадежен
+    MIN_SAMPLES = 10
+
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=100)
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def record_latency(self, latency: float) -> None:
+        """Время одного запроса с момента, когда лимитер его пропустил, — без очереди."""
+        self.latencies.append(latency)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= PROVIDER_FAILURE_THRESHOLD:
+            pause = min(PROVIDER_COOLDOWN * 2 ** (self.failures - PROVIDER_FAILURE_THRESHOLD), 600.0)
+            self.cooldown_until = time.monotonic() + pause
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self) -> float:
+        """Сколько ждать ответа, прежде чем продублировать запрос следующему провайдеру."""
+        delay = self.latency_percentile(HEDGE_PERCENTILE)
+        return delay if delay is not None else HEDGE_DEFAULT_DELAY
+
+
+class Provider:
+    """
+    Один API балансов сети. Наследник реализует request — один HTTP-запрос
+    не больше чем для batch_size адресов; ошибки запроса пробрасываются.
+    """
+
+    name: str = ""
+    batch_size: int = 1
+
+    def __init__(self):
+        self.limiter = provider_limiter(self.name)
+        self.health = ProviderHealth()
+
+    async def request(self, backend: "ChainBackend", addresses: list[str], currency: float) -> dict[str, tuple]:
+        raise NotImplementedError
+
+    async def fetch_many(
+        self, backend: "ChainBackend", addresses: list[str], currency: float, sent: Optional[asyncio.Event] = None
+    ) -> dict[str, tuple]:
+        """
+        Балансы адресов пачками по batch_size, каждая — в пределах лимитов провайдера.
+        sent выставляется, когда лимитер пропустил первый запрос: ожидание в собственной
+        очереди не считается задержкой провайдера ни в замерах, ни в таймере хеджа.
+        """
+        async def limited(chunk: list[str]) -> dict[str, tuple]:
+            async with self.limiter:
+                if sent is not None:
+                    sent.set()
+                started = time.monotonic()
+                balances = await self.request(backend, chunk, currency)
+                self.health.record_latency(time.monotonic() - started)
+                return balances
+
+        chunks = [addresses[i:i + self.batch_size] for i in range(0, len(addresses), self.batch_size)]
+        balances = {}
+        for result in await asyncio.gather(*(limited(chunk) for chunk in chunks)):
+            balances.update(result)
+        return balances
+
+
+class ChainBackend:
+    """
+    Сеть кошельков: метаданные, проверка адреса и список провайдеров в порядке приоритета.
+
+    fetch_many опрашивает провайдеров по очереди: провайдеры на паузе после серии сбоев
+    уходят в конец, при ошибке запрос переходит к следующему, а если ответ задерживается
+    дольше обычного (HEDGE_PERCENTILE), следующему провайдеру уходит дублирующий запрос —
+    побеждает первый успешный ответ. Возвращает кортежи (raw, amount, price): целое
+    число базовых единиц (сатоши, wei, нанотоны, единицы TRC-20), монеты и USD.
+    """
+
+    token: str = ""  # Значение Wallet.token
+    label: str = ""  # Название в сообщениях: BTC, USDT-TRON
+    coin: str = ""  # Единица баланса в отчете
+    gecko_id: str = ""  # id курса в CoinGecko
+    decimals: int = 0  # Знаков в базовой единице: сатоши, wei, нанотон
+    fallback_price: Optional[float] = None  # Курс, если CoinGecko не ответил (стейблкоины)
+    address_pattern: re.Pattern = re.compile(r".+")
+    provider_classes: tuple = ()
+
+    def __init__(self):
+        available = {provider.name: provider for provider in self.provider_classes}
+        names = CHAIN_PROVIDERS.get(self.token) or list(available)
+        self.providers: list[Provider] = [available[name]() for name in names if name in available]
+
+    @property
+    def batch_size(self) -> int:
+        """Адресов в одной пачке цикла проверки — по самому «широкому» провайдеру."""
+        return max((provider.batch_size for provider in self.providers), default=1)
+
+    # Сеть умеет отдавать переводы с курсора (fetch_transfers) — см. TX_CURSOR_CHAINS
+    supports_transfers: bool = False
+
+    def validate_address(self, address: str) -> bool:
+        return bool(self.address_pattern.fullmatch(address))
+
+    async def fetch_transfers(self, address: str, cursor: Optional[str]) -> tuple[list[tuple], str]:
+        """
+        Переводы адреса после курсора: ([(tx_id, raw, time UTC), ...] по возрастанию
+        времени, новый курсор). raw в базовых единицах, со знаком: поступление > 0, списание < 0.
+        Без курсора возвращает пустой список и курсор последней транзакции — история
+        до подключения режима в потоки не попадает.
+        """
+        raise NotImplementedError
+
+    def to_amount(self, raw_units) -> float:
+        """Перевод из базовых единиц сети в монеты — только для показа и оценки в USD."""
+        return int(raw_units) / 10 ** self.decimals
+
+    def to_raw(self, amount: float) -> int:
+        """Обратный перевод для старых записей, где хранилось только количество монет."""
+        return round(amount * 10 ** self.decimals)
+
+    def balance(self, raw_units, currency: float) -> tuple:
+        """Результат fetch_many для адреса: (базовые единицы, монеты, стоимость в USD)."""
+        raw = int(raw_units)
+        amount = self.to_amount(raw)
+        return raw, amount, currency * amount
+
+    def ranked_providers(self) -> list[Provider]:
+        # Сортировка устойчива: среди доступных сохраняется порядок из настроек
+        return sorted(self.providers, key=lambda provider: not provider.health.available)
+
+    async def _call(
+        self, provider: Provider, addresses: list[str], currency: float, sent: asyncio.Event
+    ) -> dict[str, tuple]:
+        try:
+            balances = await provider.fetch_many(self, addresses, currency, sent)
+        except BatchRejectedError:
+            # Провайдер жив, просто в пачке некорректный адрес — его отвергнет любой провайдер
+            provider.health.record_success()
+            raise
+        except Exception:
+            provider.health.record_failure()
+            raise
+        provider.health.record_success()
+        return balances
+
+    async def fetch_many(self, addresses: list[str], currency: float) -> dict[str, tuple]:
+        providers = self.ranked_providers()
+        if not providers:
+            raise ProvidersUnavailableError(f"для сети {self.token} не настроено ни одного провайдера")
+
+        errors: list[str] = []
+        pending: dict[asyncio.Task, Provider] = {}
+        sent: dict[asyncio.Task, asyncio.Event] = {}
+        sent_at: dict[asyncio.Task, float] = {}
+        next_index = 0
+
+        def launch() -> None:
+            nonlocal next_index
+            provider = providers[next_index]
+            next_index += 1
+            event = asyncio.Event()
+            task = asyncio.create_task(self._call(provider, addresses, currency, event))
+            pending[task] = provider
+            sent[task] = event
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if HEDGE_ENABLED and len(pending) == 1 and next_index < len(providers):
+                    (task,) = pending
+                    if not sent[task].is_set():
+                        # Запрос ещё ждет своей очереди в лимитере — таймер хеджа не идет
+                        waiter = asyncio.create_task(sent[task].wait())
+                        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                        waiter.cancel()
+                    sent_at.setdefault(task, time.monotonic())
+                    timeout = max(0.0, pending[task].health.hedge_delay() - (time.monotonic() - sent_at[task]))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Основной провайдер медлит — дублируем запрос следующему
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return task.result()
+                    except BatchRejectedError:
+                        raise
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e}")
+
+                if not pending and next_index < len(providers):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise ProvidersUnavailableError("; ".join(errors))
+
+    async def fetch_one(self, address: str, currency: float) -> tuple:
+        balances = await self.fetch_many([address], currency)
+        if address not in balances:
+            raise ValueError(f"нет адреса {address} в ответе API")
+        return balances[address]
+
+
+def _rejects_address(message: str) -> bool:
+    """Ошибка API относится к адресу (формат, контрольная сумма), а не к ключу или лимиту."""
+    message = message.lower()
+    return "invalid" in message and "address" in message and "key" not in message
+
+
+async def _report_missing(provider: Provider, missing: list[str]) -> None:
+    if missing:
+        print(f"Адрес не найден в ответе {provider.name} - {', '.join(missing)}")
+        await notify_signal(f"Адрес не найден в ответе {provider.name}", detail=', '.join(missing))
+
+
+class BlockchainInfoProvider(Provider):
+    name = "blockchain_info"
+    batch_size = BTC_BATCH_SIZE
+
+    async def request(self, backend, addresses, currency):
+        """Балансы пачки адресов одним запросом blockchain.info (адреса через «|»)."""
+        url = f"{API_BASE_URLS['blockchain_info']}/balance"
+
+        async with get_http_session().get(url, params={"active": "|".join(addresses)}) as response:
+            raise_if_throttled(response)
+            if response.status == 400:
+                body = await response.text()
+                if _rejects_address(body):
+                    raise BatchRejectedError(body)
+                raise ValueError(f"HTTP 400: {body[:200]}")
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if not isinstance(data, dict):
+            raise ValueError(f"неожиданный ответ {data!r}")
+
+        balances = {}
+        missing = []
+        for address in addresses:
+            # Проверяем наличие данных об адресе
+            if address not in data:
+                missing.append(address)
+                continue
+
+            # Баланс в сатоши (1 BTC = 100,000,000 сатоши)
+            balances[address] = backend.balance(data[address]['final_balance'], currency)
+
+        await _report_missing(self, missing)
+        return balances
+
+
+class EsploraProvider(Provider):
+    """API в стиле Esplora (mempool.space, blockstream.info): один адрес за запрос."""
+
+    async def request(self, backend, addresses, currency):
+        address = addresses[0]
+        async with get_http_session().get(f"{API_BASE_URLS[self.name]}/address/{address}") as response:
+            raise_if_throttled(response)
+            if response.status == 400:
+                body = await response.text()
+                if _rejects_address(body):
+                    raise BatchRejectedError(body)
+                raise ValueError(f"HTTP 400: {body[:200]}")
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        stats = data['chain_stats']
+        return {address: backend.balance(stats['funded_txo_sum'] - stats['spent_txo_sum'], currency)}
+
+
+class MempoolSpaceProvider(EsploraProvider):
+    name = "mempool_space"
+
+
+class BlockstreamProvider(EsploraProvider):
+    name = "blockstream"
+
+
+class EtherscanProvider(Provider):
+    name = "etherscan"
+    batch_size = ETH_BATCH_SIZE
+
+    async def request(self, backend, addresses, currency):
+        """Балансы до 20 адресов одним запросом Etherscan (action=balancemulti)."""
+        url = f"{API_BASE_URLS['etherscan']}/v2/api"
+        params = {
+            "chainid": "1",
+            "module": "account",
+            "action": "balancemulti",
+            "address": ",".join(addresses),
+            "tag": "latest",
+            "apikey": ETH_TOKEN or "",
+        }
+
+        async with get_http_session().get(url, params=params) as response:
+            raise_if_throttled(response)
+            data = await response.json(content_type=None)
+
+        if data['status'] != '1' or data['message'] != 'OK':
+            details = f"{data['message']}: {data.get('result')}"
+            # Только ошибка формата адреса; «Missing/Invalid API Key» — сбой провайдера
+            if _rejects_address(str(data.get('result'))):
+                raise BatchRejectedError(details)
+            # Etherscan сообщает о превышении лимита в теле ответа с HTTP 200
+            if "rate limit" in str(data.get('result')).lower():
+                raise RateLimitedError()
+            raise ValueError(f"Ошибка API Etherscan: {details}")
+
+        # Etherscan может вернуть адрес в другом регистре
+        by_account = {item['account'].lower(): item['balance'] for item in data['result']}
+
+        balances = {}
+        missing = []
+        for address in addresses:
+            balance_wei = by_account.get(address.lower())
+            if balance_wei is None:
+                missing.append(address)
+                continue
+
+            # Баланс в wei (1 ETH = 10^18 wei)
+            balances[address] = backend.balance(balance_wei, currency)
+
+        await _report_missing(self, missing)
+        return balances
+
+
+class EthRpcProvider(Provider):
+    """Публичный JSON-RPC узел Ethereum: eth_getBalance пачкой в одном batch-запросе."""
+
+    name = "eth_rpc"
+    batch_size = ETH_BATCH_SIZE
+
+    async def request(self, backend, addresses, currency):
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_getBalance", "params": [address, "latest"]}
+            for i, address in enumerate(addresses)
+        ]
+        async with get_http_session().post(ETH_RPC_URL, json=payload) as response:
+            raise_if_throttled(response)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if not isinstance(data, list):
+            raise ValueError(f"неожиданный ответ {data!r}")
+
+        balances = {}
+        missing = []
+        by_id = {item.get('id'): item for item in data}
+        for i, address in enumerate(addresses):
+            item = by_id.get(i, {})
+            if 'result' not in item:
+                missing.append(address)
+                continue
+            balances[address] = backend.balance(int(item['result'], 16), currency)
+
+        await _report_missing(self, missing)
+        return balances
+
+
+class ToncenterProvider(Provider):
+    name = "toncenter"
+
+    async def request(self, backend, addresses, currency):
+        address = addresses[0]
+        url = f"{API_BASE_URLS['toncenter']}/api/v2/getAddressInformation"
+
+        async with get_http_session().get(url, params={"address": address}) as response:
+            raise_if_throttled(response)
+            data = await response.json(content_type=None)
+
+        # Баланс в нанотонах (1 TON = 1e9 нанотон)
+        return {address: backend.balance(data['result']['balance'], currency)}
+
+
+class TonapiProvider(Provider):
+    name = "tonapi"
+
+    async def request(self, backend, addresses, currency):
+        address = addresses[0]
+        async with get_http_session().get(f"{API_BASE_URLS['tonapi']}/v2/accounts/{address}") as response:
+            raise_if_throttled(response)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        return {address: backend.balance(data['balance'], currency)}
+
+
+class TronscanProvider(Provider):
+    name = "tronscan"
+
+    async def request(self, backend, addresses, currency):
+        address = addresses[0]
+        # API endpoint для получения информации об аккаунте
+        url = f"{API_BASE_URLS['tronscan']}/api/account"
+
+        async with get_http_session().get(url, params={"address": address}) as response:
+            raise_if_throttled(response)
+            data = await response.json(content_type=None)
+
+        # Проверяем наличие данных об аккаунте
+        if 'trc20token_balances' not in data:
+            return {address: backend.balance(0, currency)}
+
+        # Ищем USDT среди TRC20 токенов
+        usdt_raw = 0
+        for token in data['trc20token_balances']:
+            if token['tokenId'] == backend.usdt_contract_address:
+                # Баланс в базовых единицах токена, приведенный к decimals сети
+                usdt_raw = int(token['balance']) * 10 ** backend.decimals // 10 ** int(token['tokenDecimal'])
+                break
+
+        return {address: backend.balance(usdt_raw, currency)}
+
+
+class TronGridProvider(Provider):
+    name = "trongrid"
+
+    async def request(self, backend, addresses, currency):
+        address = addresses[0]
+        url = f"{API_BASE_URLS['trongrid']}/v1/accounts/{address}"
+
+        async with get_http_session().get(url) as response:
+            raise_if_throttled(response)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if not data.get('success', True):
+            raise ValueError(f"неожиданный ответ {data!r}")
+
+        # Неактивированный аккаунт — пустой data, баланс 0
+        usdt_raw = 0
+        for account in data.get('data') or []:
+            for token in account.get('trc20') or []:
+                if backend.usdt_contract_address in token:
+                    usdt_raw = token[backend.usdt_contract_address]
+
+        return {address: backend.balance(usdt_raw, currency)}
+
+
+class BitcoinBackend(ChainBackend):
+    token = "btc"
+    label = "BTC"
+    coin = "btc"
+    gecko_id = "bitcoin"
+    decimals = 8
+    address_pattern = re.compile(
+        r"[13][a-km-zA-HJ-NP-Z1-9]{25,34}|bc1[02-9ac-hj-np-z]{11,71}|BC1[02-9AC-HJ-NP-Z]{11,71}"
+    )
+    provider_classes = (BlockchainInfoProvider, MempoolSpaceProvider, BlockstreamProvider)
+
+
+class EthereumBackend(ChainBackend):
+    token = "eth"
+    label = "ETH"
+    coin = "eth"
+    gecko_id = "ethereum"
+    decimals = 18
+    address_pattern = re.compile(r"0x[0-9a-fA-F]{40}")
+    provider_classes = (EtherscanProvider, EthRpcProvider)
+
+
+class TonBackend(ChainBackend):
+    token = "ton"
+    label = "TON"
+    coin = "ton"
+    gecko_id = "the-open-network"
+    decimals = 9
+    # Сырой адрес «0:hex» или user-friendly base64/base64url из 48 символов
+    address_pattern = re.compile(r"-?\d+:[0-9a-fA-F]{64}|[A-Za-z0-9_+/-]{48}")
+    provider_classes = (ToncenterProvider, TonapiProvider)
+    supports_transfers = True
+
+    async def _transactions(self, params: dict) -> list[dict]:
+        url = f"{API_BASE_URLS['toncenter']}/api/v2/getTransactions"
+        async with provider_limiter("toncenter"), get_http_session().get(url, params=params) as response:
+            raise_if_throttled(response)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        if not data.get('ok', False):
+            raise ValueError(f"Ошибка API toncenter: {data.get('error')}")
+        return data['result']
+
+    async def fetch_transfers(self, address, cursor):
+        """Курсор — логическое время (lt) последней учтенной транзакции."""
+        if cursor is None:
+            latest = await self._transactions({"address": address, "limit": 1})
+            return [], latest[0]['transaction_id']['lt'] if latest else "0"
+
+        # toncenter отдает от новых к старым; листаем, пока не дойдем до курсора (to_lt)
+        transactions = []
+        params = {"address": address, "limit": TX_PAGE_SIZE, "to_lt": cursor}
+        while True:
+            page = await self._transactions(params)
+            transactions.extend(tx for tx in page if int(tx['transaction_id']['lt']) > int(cursor))
+            oldest = page[-1]['transaction_id'] if page else None
+            # Страница начинается с транзакции lt/hash включительно: не сдвинулись — дальше нечего
+            if len(page) < TX_PAGE_SIZE or oldest['lt'] == params.get("lt"):
+                break
+            params = {**params, "lt": oldest['lt'], "hash": oldest['hash']}
+
+        transfers = {}
+        for tx in transactions:
+            # Изменение баланса: входящее сообщение минус исходящие и комиссия, в нанотонах
+            raw = int(tx.get('in_msg', {}).get('value') or 0)
+            raw -= sum(int(message.get('value') or 0) for message in tx.get('out_msgs', []))
+            raw -= int(tx.get('fee') or 0)
+            moment = datetime.fromtimestamp(tx['utime'], timezone.utc).replace(tzinfo=None)
+            transfers[tx['transaction_id']['lt']] = (tx['transaction_id']['hash'], raw, moment)
+
+        ordered = sorted(transfers.items(), key=lambda item: int(item[0]))
+        new_cursor = ordered[-1][0] if ordered else cursor
+        return [transfer for _, transfer in ordered if transfer[1] != 0], new_cursor
+
+
+class TronUsdtBackend(ChainBackend):
+    """USDT (TRC-20) на кошельках сети Tron."""
+
+    token = "tron"
+    label = "USDT-TRON"
+    coin = "usdt"
+    gecko_id = "tether"  # Курс USDT, а не самой сети Tron
+    decimals = 6
+    fallback_price = 1.0
+    address_pattern = re.compile(r"T[1-9A-HJ-NP-Za-km-z]{33}")
+    provider_classes = (TronscanProvider, TronGridProvider)
+
+    supports_transfers = True
+
+    # USDT contract address on TRON (для проверки в ответе)
+    usdt_contract_address = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+
+    async def _trc20_page(self, address: str, params: dict) -> dict:
+        url = f"{API_BASE_URLS['trongrid']}/v1/accounts/{address}/transactions/trc20"
+        params = {"contract_address": self.usdt_contract_address, "only_confirmed": "true", **params}
+        async with provider_limiter("trongrid"), get_http_session().get(url, params=params) as response:
+            raise_if_throttled(response)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        if not data.get('success', True):
+            raise ValueError(f"неожиданный ответ {data!r}")
+        return data
+
+    async def fetch_transfers(self, address, cursor):
+        """Курсор — время блока (мс) последнего учтенного перевода USDT."""
+        if cursor is None:
+            latest = await self._trc20_page(address, {"limit": 1, "order_by": "block_timestamp,desc"})
+            items = latest.get('data') or []
+            return [], str(items[0]['block_timestamp']) if items else "0"
+
+        params = {
+            "limit": TX_PAGE_SIZE,
+            "order_by": "block_timestamp,asc",
+            "min_timestamp": int(cursor) + 1,
+        }
+        items = []
+        while True:
+            page = await self._trc20_page(address, params)
+            items.extend(page.get('data') or [])
+            fingerprint = page.get('meta', {}).get('fingerprint')
+            if not fingerprint:
+                break
+            params = {**params, "fingerprint": fingerprint}
+
+        transfers = []
+        new_cursor = int(cursor)
+        for item in items:
+            if item['to'] == item['from']:
+                continue
+            value = int(item['value']) * 10 ** self.decimals // 10 ** int(item['token_info']['decimals'])
+            raw = value if item['to'] == address else -value
+            moment = datetime.fromtimestamp(item['block_timestamp'] / 1000, timezone.utc).replace(tzinfo=None)
+            transfers.append((item['transaction_id'], raw, moment))
+            new_cursor = max(new_cursor, int(item['block_timestamp']))
+        return transfers, str(new_cursor)
+
+
+# Реестр сетей: token -> backend. Порядок регистрации — порядок сетей в списках и отчетах
+CHAINS: dict[str, ChainBackend] = {}
+
+
+def register_chain(backend: ChainBackend) -> ChainBackend:
+    CHAINS[backend.token] = backend
+    return backend
+
+
+register_chain(BitcoinBackend())
+register_chain(EthereumBackend())
+register_chain(TonBackend())
+register_chain(TronUsdtBackend())
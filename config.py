@@ -1,10 +1,13 @@
 from dotenv import load_dotenv
 import os
-from typing import Set, Optional
+from typing import Dict, List, Set, Optional
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
+# Путь к базе данных (по умолчанию db/database.db относительно рабочей папки)
+DB_URL: str = os.environ.get("DB_URL", "sqlite+aiosqlite:///db/database.db")
+
 # Токен бота Telegram
 TG_TOKEN: Optional[str] = os.environ.get("TG_TOKEN")
 
@@ -18,3 +21,167 @@ SIGNAL: Optional[int] = int(_signal_raw) if _signal_raw else None
 
 # Опционально: https://docs.coingecko.com/ — снимает жёсткие лимиты бесплатного tier
 COINGECKO_DEMO_API_KEY: Optional[str] = os.environ.get("COINGECKO_DEMO_API_KEY")
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    return int(raw) if raw else default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    return float(raw) if raw else default
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
+
+def _provider_limits(prefix: str, concurrency: int, rps: float) -> Dict[str, float]:
+    rps = _env_float(f"{prefix}_RPS", rps)
+    return {
+        "concurrency": _env_int(f"{prefix}_CONCURRENCY", concurrency),
+        "rps": rps,
+        "max_rps": _env_float(f"{prefix}_MAX_RPS", rps * RATE_MAX_MULTIPLIER),
+    }
+
+
+# Адаптивный лимит (AIMD): без 429 скорость растет примерно на RATE_INCREASE запросов/с
+# каждую секунду, но не выше <PROVIDER>_MAX_RPS; на 429 падает в RATE_DECREASE_FACTOR раз
+# (не ниже RATE_MIN_FRACTION от стартовой), а запросы ждут Retry-After
+# (или RATE_DEFAULT_PAUSE секунд, если заголовка нет)
+RATE_MAX_MULTIPLIER: float = _env_float("RATE_MAX_MULTIPLIER", 4.0)
+RATE_INCREASE: float = _env_float("RATE_INCREASE", 0.1)
+RATE_DECREASE_FACTOR: float = _env_float("RATE_DECREASE_FACTOR", 0.5)
+RATE_MIN_FRACTION: float = _env_float("RATE_MIN_FRACTION", 0.1)
+RATE_DEFAULT_PAUSE: float = _env_float("RATE_DEFAULT_PAUSE", 5.0)
+
+# Лимиты запросов к провайдерам балансов и курсов: одновременные запросы и запросов в секунду
+# на старте; ключ — провайдер (один хост API), лимитер общий для всех его запросов
+PROVIDER_LIMITS: Dict[str, Dict[str, float]] = {
+    "blockchain_info": _provider_limits("BLOCKCHAIN_INFO", 2, 1.0),
+    "mempool_space": _provider_limits("MEMPOOL_SPACE", 2, 2.0),
+    "blockstream": _provider_limits("BLOCKSTREAM", 2, 2.0),
+    "etherscan": _provider_limits("ETHERSCAN", 4, 4.0),
+    "eth_rpc": _provider_limits("ETH_RPC", 2, 2.0),
+    "toncenter": _provider_limits("TONCENTER", 1, 1.0),
+    "tonapi": _provider_limits("TONAPI", 1, 1.0),
+    "tronscan": _provider_limits("TRONSCAN", 3, 3.0),
+    "trongrid": _provider_limits("TRONGRID", 3, 3.0),
+    "coingecko": _provider_limits("COINGECKO", 1, 0.5),
+}
+
+# Провайдеры каждой сети в порядке приоритета; при сбоях следующий подхватывает запросы
+CHAIN_PROVIDERS: Dict[str, List[str]] = {
+    "btc": _env_list("BTC_PROVIDERS", "blockchain_info,mempool_space,blockstream"),
+    "eth": _env_list("ETH_PROVIDERS", "etherscan,eth_rpc"),
+    "ton": _env_list("TON_PROVIDERS", "toncenter,tonapi"),
+    "tron": _env_list("TRON_PROVIDERS", "tronscan,trongrid"),
+}
+ETH_RPC_URL: str = os.environ.get("ETH_RPC_URL", "https://ethereum-rpc.publicnode.com")
+
+# Базовые адреса API провайдеров (<PROVIDER>_URL); переопределяются, например,
+# локальным стендом из bench/bench_cycle.py
+API_BASE_URLS: Dict[str, str] = {
+    "blockchain_info": os.environ.get("BLOCKCHAIN_INFO_URL", "https://blockchain.info"),
+    "mempool_space": os.environ.get("MEMPOOL_SPACE_URL", "https://mempool.space/api"),
+    "blockstream": os.environ.get("BLOCKSTREAM_URL", "https://blockstream.info/api"),
+    "etherscan": os.environ.get("ETHERSCAN_URL", "https://api.etherscan.io"),
+    "toncenter": os.environ.get("TONCENTER_URL", "https://toncenter.com"),
+    "tonapi": os.environ.get("TONAPI_URL", "https://tonapi.io"),
+    "tronscan": os.environ.get("TRONSCAN_URL", "https://apilist.tronscanapi.com"),
+    "trongrid": os.environ.get("TRONGRID_URL", "https://api.trongrid.io"),
+    "coingecko": os.environ.get("COINGECKO_URL", "https://api.coingecko.com"),
+}
+
+# Здоровье провайдера: после PROVIDER_FAILURE_THRESHOLD ошибок подряд он уходит в конец очереди
+# на PROVIDER_COOLDOWN секунд (удваивается при повторных сбоях, не больше 10 минут)
+PROVIDER_FAILURE_THRESHOLD: int = _env_int("PROVIDER_FAILURE_THRESHOLD", 3)
+PROVIDER_COOLDOWN: float = _env_float("PROVIDER_COOLDOWN", 30.0)
+
+# Хеджирование: если основной провайдер не ответил за перцентиль HEDGE_PERCENTILE своих задержек
+# (или HEDGE_DEFAULT_DELAY, пока замеров мало), тот же запрос уходит следующему провайдеру
+HEDGE_ENABLED: bool = os.environ.get("HEDGE_ENABLED", "1") not in ("0", "false", "no")
+HEDGE_PERCENTILE: float = _env_float("HEDGE_PERCENTILE", 0.95)
+HEDGE_DEFAULT_DELAY: float = _env_float("HEDGE_DEFAULT_DELAY", 5.0)
+
+# Инкрементальный опрос: кошелек с движением за последние POLL_HOT_WINDOW часов проверяется
+# раз в POLL_HOT_INTERVAL секунд, с движением за POLL_WARM_WINDOW часов или балансом
+# от POLL_LARGE_BALANCE_USD — раз в POLL_WARM_INTERVAL, остальные — раз в POLL_COLD_INTERVAL.
+# Ни один кошелек не остается непроверенным дольше POLL_MAX_STALENESS секунд
+POLL_INCREMENTAL: bool = os.environ.get("POLL_INCREMENTAL", "1") not in ("0", "false", "no")
+POLL_HOT_INTERVAL: float = _env_float("POLL_HOT_INTERVAL", 300.0)
+POLL_WARM_INTERVAL: float = _env_float("POLL_WARM_INTERVAL", 1800.0)
+POLL_COLD_INTERVAL: float = _env_float("POLL_COLD_INTERVAL", 3600.0)
+POLL_MAX_STALENESS: float = _env_float("POLL_MAX_STALENESS", 3600.0)
+POLL_HOT_WINDOW: float = _env_float("POLL_HOT_WINDOW", 24.0)
+POLL_WARM_WINDOW: float = _env_float("POLL_WARM_WINDOW", 24.0 * 7)
+POLL_LARGE_BALANCE_USD: float = _env_float("POLL_LARGE_BALANCE_USD", 10000.0)
+
+# Планировщик: у каждого кошелька свой срок следующей проверки, сдвинутый на случайную
+# долю интервала до POLL_JITTER (раньше срока, не позже); SCHEDULER_WORKERS задач забирают
+# подошедшие кошельки вместе с кошельками той же сети, чей срок наступит в пределах той же
+# доли интервала (одна пачка — один запрос). Сводка с балансами уходит раз в REPORT_INTERVAL
+# секунд, если были изменения; тогда же подхватываются добавленные и удаленные кошельки
+POLL_JITTER: float = _env_float("POLL_JITTER", 0.1)
+SCHEDULER_WORKERS: int = _env_int("SCHEDULER_WORKERS", 4)
+SCHEDULER_STARTUP_SPREAD: float = _env_float("SCHEDULER_STARTUP_SPREAD", 60.0)
+REPORT_INTERVAL: float = _env_float("REPORT_INTERVAL", 300.0)
+
+# Сети, где изменения считаются по транзакциям с сохраненного курсора (wallet.tx_cursor),
+# а не по разнице балансов: переводы записываются по одному, снимок баланса — только
+# при изменениях. Поддерживаются ton и tron; TX_PAGE_SIZE — транзакций на страницу API
+TX_CURSOR_CHAINS: Set[str] = set(_env_list("TX_CURSOR_CHAINS", ""))
+TX_PAGE_SIZE: int = _env_int("TX_PAGE_SIZE", 50)
+
+# Снимок баланса пишется при изменении и, если изменений нет, раз в BALANCE_HEARTBEAT_HOURS
+BALANCE_HEARTBEAT_HOURS: float = _env_float("BALANCE_HEARTBEAT_HOURS", 24.0)
+
+# Прореживание истории balance: все снимки за RETENTION_RAW_DAYS дней, по одному в час
+# до RETENTION_HOURLY_DAYS дней, дальше по одному в сутки; последний снимок кошелька
+# остается всегда. Удаленные строки дописываются в gzip JSONL в RETENTION_ARCHIVE_DIR.
+# Запуск раз в RETENTION_INTERVAL_HOURS, удаление пачками по RETENTION_BATCH_SIZE строк
+RETENTION_ENABLED: bool = os.environ.get("RETENTION_ENABLED", "1") not in ("0", "false", "no")
+RETENTION_RAW_DAYS: float = _env_float("RETENTION_RAW_DAYS", 7.0)
+RETENTION_HOURLY_DAYS: float = _env_float("RETENTION_HOURLY_DAYS", 90.0)
+RETENTION_INTERVAL_HOURS: float = _env_float("RETENTION_INTERVAL_HOURS", 24.0)
+RETENTION_BATCH_SIZE: int = _env_int("RETENTION_BATCH_SIZE", 2000)
+RETENTION_ARCHIVE_DIR: str = os.environ.get("RETENTION_ARCHIVE_DIR", "db/archive")
+RETENTION_VACUUM_PAGES: int = _env_int("RETENTION_VACUUM_PAGES", 2000)
+
+# Метрики в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics, 0 — выключено
+METRICS_HOST: str = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT: int = _env_int("METRICS_PORT", 9108)
+
+# Кэш курсов CoinGecko: моложе PRICE_TTL секунд — отдается как есть, старше — отдается сразу
+# и обновляется в фоне; курс старше PRICE_MAX_STALE попадает в лог как устаревший
+PRICE_TTL: float = _env_float("PRICE_TTL", 120.0)
+PRICE_MAX_STALE: float = _env_float("PRICE_MAX_STALE", 900.0)
+
+# Общий HTTP-клиент для запросов к API блокчейнов и CoinGecko
+HTTP_TIMEOUT: float = _env_float("HTTP_TIMEOUT", 25.0)
+HTTP_CONNECT_TIMEOUT: float = _env_float("HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP_POOL_LIMIT: int = _env_int("HTTP_POOL_LIMIT", 50)
+HTTP_POOL_LIMIT_PER_HOST: int = _env_int("HTTP_POOL_LIMIT_PER_HOST", 8)
+HTTP_DNS_CACHE_TTL: int = _env_int("HTTP_DNS_CACHE_TTL", 600)
+
+# Сколько BTC-адресов запрашивать у blockchain.info одним запросом
+BTC_BATCH_SIZE: int = _env_int("BTC_BATCH_SIZE", 100)
+# Etherscan balancemulti принимает не больше 20 адресов за запрос
+ETH_BATCH_SIZE: int = min(_env_int("ETH_BATCH_SIZE", 20), 20)
+
+# Рассылка отчетов: Telegram допускает ~30 сообщений в секунду на бота и ~1 в секунду в один чат
+TG_BROADCAST_CONCURRENCY: int = _env_int("TG_BROADCAST_CONCURRENCY", 10)
+TG_BROADCAST_RPS: float = _env_float("TG_BROADCAST_RPS", 25.0)
+TG_PER_CHAT_INTERVAL: float = _env_float("TG_PER_CHAT_INTERVAL", 1.0)
+TG_SEND_ATTEMPTS: int = _env_int("TG_SEND_ATTEMPTS", 3)
+
+# Очередь исходящих сообщений: как часто отправлять накопленное, сколько строк за раз,
+# сколько попыток на сообщение. Неотправленное откладывается на OUTBOX_RETRY_BASE × 2^n
+# секунд (не больше OUTBOX_RETRY_MAX); недоступность Telegram (сеть, 5xx, RetryAfter)
+# попыткой не считается — такие сообщения ждут, пока Telegram не ответит
+OUTBOX_POLL_INTERVAL: float = _env_float("OUTBOX_POLL_INTERVAL", 5.0)
+OUTBOX_BATCH_SIZE: int = _env_int("OUTBOX_BATCH_SIZE", 500)
+OUTBOX_MAX_ATTEMPTS: int = _env_int("OUTBOX_MAX_ATTEMPTS", 5)
+OUTBOX_RETRY_BASE: float = _env_float("OUTBOX_RETRY_BASE", 5.0)
+OUTBOX_RETRY_MAX: float = _env_float("OUTBOX_RETRY_MAX", 600.0)
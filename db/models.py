@@ -1,13 +1,61 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, BigInteger, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, BigInteger, ForeignKey, Float, Index
+from sqlalchemy import UniqueConstraint, event, text
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, relationship
 from datetime import datetime
 
-# Настройка асинхронного подключения к SQLite3
-DB_URL = "sqlite+aiosqlite:///db/database.db"
+# Настройка асинхронного подключения к SQLite3 (путь задается в config.DB_URL)
+from config import DB_URL
+
+# PRAGMA для каждого нового соединения: WAL позволяет читать во время записи,
+# synchronous=NORMAL в режиме WAL безопасен и делает fsync только на checkpoint
+SQLITE_PRAGMAS = (
+    # Освобождение страниц после прореживания истории по частям (retention.py); для уже
+    # существующей базы включается только после полного VACUUM (python -m retention --vacuum)
+    ("auto_vacuum", "INCREMENTAL"),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-20000"),  # ~20 МБ страничного кэша на соединение
+    ("mmap_size", "268435456"),  # 256 МБ
+    ("busy_timeout", "5000"),  # мс ожидания блокировки вместо «database is locked»
+    ("temp_store", "MEMORY"),
+)
+
+# Чтение — пул соединений для обработчиков бота и цикла проверки
 engine = create_async_engine(DB_URL)  # Асинхронный движок SQLAlchemy
-Session = async_sessionmaker(expire_on_commit=False, bind=engine)  # Фабрика сессий
+# Запись — единственное соединение, все записи выполняются строго по очереди
+write_engine = create_async_engine(DB_URL, pool_size=1, max_overflow=0)
+
+Session = async_sessionmaker(expire_on_commit=False, bind=engine)  # Фабрика сессий для чтения
+WriteSession = async_sessionmaker(expire_on_commit=False, bind=write_engine)  # Фабрика сессий для записи
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+event.listen(write_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+
+class BaseUnits(TypeDecorator):
+    """
+    Целое число базовых единиц сети (сатоши, wei, нанотоны, единицы TRC-20) без потери точности.
+    Хранится текстом: баланс в wei не помещается в 64-битный INTEGER SQLite.
+    """
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else str(int(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value)
 
 
 class Base(DeclarativeBase, AsyncAttrs):
@@ -23,6 +71,8 @@ class Wallet(Base):
     address = Column(String, unique=True, nullable=False)
     token = Column(String, nullable=False)  # btc, eth, ton, tron
     time_add = Column(DateTime, default=datetime.utcnow)
+    tx_cursor = Column(String, nullable=True)  # Последняя учтенная транзакция (режим TX_CURSOR_CHAINS)
+    last_checked_at = Column(DateTime, nullable=True)  # Последняя успешная проверка (UTC)
 
     balance = relationship("Balance", back_populates="wallet")
 
@@ -30,11 +80,16 @@ class Wallet(Base):
 class Balance(Base):
     """Модель для хранения данных по балансам кошельков"""
     __tablename__ = "balance"
+    __table_args__ = (
+        # Последний снимок кошелька и удаление истории кошелька
+        Index("ix_balance_wallet_time", "wallet_id", "time_check"),
+    )
 
     id = Column(Integer, primary_key=True)
     wallet_id = Column(Integer, ForeignKey("wallet.id"))
     coin = Column(String, nullable=False)
-    amount = Column(Float, default=0.0)
+    amount = Column(Float, default=0.0)  # Монеты — для показа; сравнение идет по amount_raw
+    amount_raw = Column(BaseUnits, nullable=True)  # Базовые единицы; NULL в записях до миграции
     price = Column(Float, default=0.0)  # Стоимость в USD
     time_check = Column(DateTime, default=datetime.utcnow)
 
@@ -54,26 +109,165 @@ class User(Base):
 class CryptoFlow(Base):
     """Модель для отслеживания изменений баланса"""
     __tablename__ = "crypto_flow"
+    __table_args__ = (
+        # Покрывающий индекс для статистики: фильтр по времени, сумма price, группировка по кошельку
+        Index("ix_crypto_flow_time_wallet_price", "time_created", "wallet_id", "price"),
+        Index("ix_crypto_flow_wallet", "wallet_id"),
+        # Перевод по курсору записывается один раз, даже если его вернули две проверки
+        Index("uq_crypto_flow_wallet_tx", "wallet_id", "tx_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     wallet_id = Column(Integer, ForeignKey("wallet.id"))
     amount = Column(Float, nullable=False)  # Изменение количества монет
+    amount_raw = Column(BaseUnits, nullable=True)  # То же в базовых единицах, точно
     coin = Column(String, nullable=False)    # Тип монеты
     price = Column(Float, nullable=False)    # Стоимость изменения в USD
     time_created = Column(DateTime, default=datetime.utcnow)
+    tx_id = Column(String, nullable=True)  # Хэш транзакции для переводов по курсору, иначе NULL
 
     wallet = relationship("Wallet")
 
 
+class FlowDaily(Base):
+    """Суточные итоги CryptoFlow по кошельку: день по московскому времени (UTC+3)"""
+    __tablename__ = "flow_daily"
+    __table_args__ = (
+        UniqueConstraint("wallet_id", "day", name="uq_flow_daily_wallet_day"),
+        # Покрывающий индекс: статистика читает только day, wallet_id и суммы
+        Index("ix_flow_daily_day", "day", "wallet_id", "inflow", "outflow"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    wallet_id = Column(Integer, ForeignKey("wallet.id"))
+    day = Column(Date, nullable=False)
+    inflow = Column(Float, nullable=False, default=0.0)   # Сумма положительных price за день
+    outflow = Column(Float, nullable=False, default=0.0)  # Сумма |price| отрицательных за день
+
+
+class OutboxMessage(Base):
+    """Очередь исходящих сообщений Telegram — переживает перезапуск бота"""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # signal — служебный сигнал, message — отчет
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(String, nullable=False)
+    detail = Column(String, nullable=True)  # Адрес и т.п. — одинаковые сигналы сводятся в один
+    with_keyboard = Column(Boolean, default=False)  # Отправить с клавиатурой администратора
+    attempts = Column(Integer, default=0)  # Неудачи по вине сообщения — до OUTBOX_MAX_ATTEMPTS
+    retries = Column(Integer, default=0)  # Все неудачные отправки — показатель отсрочки
+    next_attempt_at = Column(DateTime, nullable=True)  # Не отправлять раньше (UTC)
+    time_created = Column(DateTime, default=datetime.utcnow)
+
+
 class Currency(Base):
     __tablename__ = "currency"
 
     id = Column(Integer, primary_key=True)
-    coin = Column(String, nullable=False)
+    coin = Column(String, nullable=False, unique=True, index=True)
     currency = Column(Float, nullable=False)
 
 
+class PriceHistory(Base):
+    """Курс монеты в USD на момент запроса к CoinGecko: одна строка на монету за обновление"""
+    __tablename__ = "price_history"
+    __table_args__ = (
+        # Покрывающий индекс: курс на момент и ряд курсов за период читаются без обращения к таблице
+        Index("ix_price_history_coin_time", "coin", "time", "usd"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    coin = Column(String, nullable=False)  # btc, eth, ton, tron — как currency.coin
+    time = Column(DateTime, nullable=False)  # UTC
+    usd = Column(Float, nullable=False)
+
+
+def _add_missing_columns(conn) -> None:
+    """
+    Миграция существующих баз: create_all не добавляет колонки в уже созданные таблицы,
+    поэтому новые колонки моделей (только необязательные) добавляются через ALTER TABLE.
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info('{table.name}')"))}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+
+def _unique_currency_coin(conn) -> None:
+    """
+    Миграция: в старых базах индекс currency.coin не уникальный и возможны дубли монет.
+    Оставляет последнюю запись каждой монеты и пересоздает индекс уникальным,
+    чтобы курсы можно было записывать одним upsert.
+    """
+    indexes = conn.execute(text("PRAGMA index_list('currency')")).all()
+    if any(row[1] == "ix_currency_coin" and row[2] for row in indexes):
+        return
+    conn.execute(text(
+        "DELETE FROM currency WHERE id NOT IN (SELECT MAX(id) FROM currency GROUP BY coin)"
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS ix_currency_coin"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_currency_coin ON currency (coin)"))
+
+
+def _create_missing_indexes(conn) -> None:
+    """
+    Миграция существующих баз: create_all не трогает уже созданные таблицы,
+    поэтому индексы, добавленные в модели позже, создаются отдельно.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _backfill_flow_daily(conn) -> None:
+    """Миграция: заполняет пустую flow_daily по уже накопленным записям crypto_flow."""
+    if conn.execute(text("SELECT 1 FROM flow_daily LIMIT 1")).first():
+        return
+    conn.execute(text(
+        """
+        INSERT INTO flow_daily (wallet_id, day, inflow, outflow)
+        SELECT wallet_id,
+               date(substr(time_created, 1, 19), '+3 hours'),
+               SUM(CASE WHEN price > 0 THEN price ELSE 0 END),
+               SUM(CASE WHEN price < 0 THEN -price ELSE 0 END)
+        FROM crypto_flow
+        GROUP BY 1, 2
+        """
+    ))
+
+
+def _backfill_price_history(conn) -> None:
+    """
+    Миграция: восстанавливает ряд курсов по уже накопленным снимкам balance
+    (курс = стоимость / количество), пока price_history пуста.
+
+    balance.time_check пишется по локальному времени сервера, а price_history.time — в UTC:
+    время переводится модификатором 'utc' SQLite по часовому поясу того же процесса
+    (с учетом летнего времени на дату снимка), дробная часть секунд сохраняется.
+    """
+    if conn.execute(text("SELECT 1 FROM price_history LIMIT 1")).first():
+        return
+    conn.execute(text(
+        """
+        INSERT INTO price_history (coin, time, usd)
+        SELECT coin, datetime(substr(time_check, 1, 19), 'utc') || substr(time_check, 20), MAX(price / amount)
+        FROM balance
+        WHERE amount > 0 AND time_check IS NOT NULL
+        GROUP BY coin, time_check
+        """
+    ))
+
+
 async def create_tables():
-    """Создает таблицы в базе данных"""
-    async with engine.begin() as conn:
+    """Создает таблицы в базе данных и недостающие индексы"""
+    async with write_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_unique_currency_coin)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_backfill_flow_daily)
+        await conn.run_sync(_backfill_price_history)
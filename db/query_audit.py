@@ -0,0 +1,98 @@
+"""
+Проверка планов горячих запросов через EXPLAIN QUERY PLAN.
+
+Запуск: python -m db.query_audit [путь к database.db]
+Без аргумента проверяется схема из моделей на пустой базе в памяти, с аргументом —
+существующий файл (после миграции в create_tables). Код возврата 1, если какой-либо
+запрос читает таблицу полным сканированием без индекса.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from db.models import Base, Balance, CryptoFlow, Currency, FlowDaily
+from price_history import price_at_query
+from stats import flow_totals_query, period_bounds
+
+
+# Полный проход по таблице, допустимый для запроса: итоги «за всё время» читают весь
+# flow_daily — это O(дней × кошельков), а не O(записей crypto_flow)
+FULL_SCAN_ALLOWED = {
+    "show_stats": {"flow_daily"},
+}
+
+
+def hot_queries() -> dict:
+    """Запросы статистики, цикла проверки и удаления кошелька."""
+    since = datetime.utcnow() - timedelta(days=30)
+    until = datetime.utcnow()
+    latest = (
+        select(func.max(Balance.id).label("id"))
+        .group_by(Balance.wallet_id)
+        .subquery()
+    )
+    return {
+        "show_stats": flow_totals_query(period_bounds()),
+        "custom_range_inflows_by_wallet": select(
+            FlowDaily.wallet_id, func.sum(FlowDaily.inflow)
+        ).where(
+            FlowDaily.day >= since.date(),
+            FlowDaily.day <= until.date(),
+        ).group_by(FlowDaily.wallet_id),
+        "warm_balance_cache": select(
+            Balance.wallet_id, Balance.coin, Balance.amount, Balance.amount_raw,
+            Balance.price, Balance.time_check,
+        ).join(
+            latest, Balance.id == latest.c.id
+        ),
+        "delete_wallet_flows": delete(CryptoFlow).where(CryptoFlow.wallet_id == 1),
+        "delete_wallet_balances": delete(Balance).where(Balance.wallet_id == 1),
+        "delete_wallet_rollup": delete(FlowDaily).where(FlowDaily.wallet_id == 1),
+        "currency_by_coin": select(Currency.currency).where(Currency.coin == "btc"),
+        "price_at": price_at_query("btc", since),
+    }
+
+
+def _full_scans(plan_rows, allowed: set[str]) -> list[str]:
+    """Строки плана с полным сканированием таблицы без индекса (кроме разрешенных таблиц)."""
+    tables = set(Base.metadata.tables) - allowed
+    scans = []
+    for *_, detail in plan_rows:
+        words = detail.split()
+        if words[0] == "SCAN" and words[1] in tables and " USING " not in detail:
+            scans.append(detail)
+    return scans
+
+
+async def audit(db_url: str, create_schema: bool) -> bool:
+    engine = create_async_engine(db_url)
+    ok = True
+    try:
+        async with engine.begin() as conn:
+            if create_schema:
+                await conn.run_sync(Base.metadata.create_all)
+            for name, statement in hot_queries().items():
+                compiled = statement.compile(dialect=engine.dialect)
+                params = tuple(compiled.params[key] for key in compiled.positiontup)
+                result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+                plan = result.all()
+                scans = _full_scans(plan, FULL_SCAN_ALLOWED.get(name, set()))
+                status = "FAIL" if scans else "ok"
+                print(f"[{status}] {name}")
+                for *_, detail in plan:
+                    print(f"       {detail}")
+                ok = ok and not scans
+    finally:
+        await engine.dispose()
+    return ok
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        ok = asyncio.run(audit(f"sqlite+aiosqlite:///{sys.argv[1]}", create_schema=False))
+    else:
+        ok = asyncio.run(audit("sqlite+aiosqlite://", create_schema=True))
+    sys.exit(0 if ok else 1)
@@ -1,6 +1,6 @@
 import html
 import re
-from datetime import date, datetime, timedelta
+from datetime import date
 
 from aiogram import Router, F
 from aiogram.types import (
@@ -15,15 +15,21 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, delete, update
 from sqlalchemy.exc import IntegrityError
 
-from db.models import Session, Wallet, Balance, User, CryptoFlow
+from balance_cache import forget_wallet
+from chains import CHAINS
+from poll_schedule import unschedule_wallet
+from db.models import Session, WriteSession, Wallet, Balance, User, CryptoFlow, FlowDaily
 from config import ADMIN_IDS, USER_PASS
+from metrics import summary as metrics_summary
+from stats import flow_totals, inflows_by_wallet
 
 router = Router()
 
-TOKEN_ORDER = ("btc", "eth", "ton", "tron")
+# Порядок сетей в списке кошельков — порядок регистрации в chains.CHAINS
+TOKEN_ORDER = tuple(CHAINS)
 WALLET_PAGE_SIZE = 20
 
 
@@ -56,14 +62,6 @@ def stats_custom_inline_keyboard() -> InlineKeyboardMarkup:
     )
 
 
-def _day_boundary_datetime(d: date, *, end_of_day: bool) -> datetime:
-    """Как в show_stats: полуночь календарного дня в UTC, сдвиг −3 ч."""
-    base = datetime(d.year, d.month, d.day, 0, 0, 0)
-    if end_of_day:
-        base = base + timedelta(days=1)
-    return base - timedelta(hours=3)
-
-
 def parse_date_ddmmyy(text: str) -> tuple[date | None, str | None]:
     """
     Формат ДД.ММ.ГГ или ДД.ММ.ГГГГ (цифры, разделитель точка).
@@ -214,14 +212,17 @@ async def build_wallets_message_payload(
 
 
 async def delete_wallet_cascade(wallet_id: int) -> bool:
-    async with Session() as session:
+    async with WriteSession() as session:
         w = await session.get(Wallet, wallet_id)
         if not w:
             return False
         await session.execute(delete(CryptoFlow).where(CryptoFlow.wallet_id == wallet_id))
+        await session.execute(delete(FlowDaily).where(FlowDaily.wallet_id == wallet_id))
         await session.execute(delete(Balance).where(Balance.wallet_id == wallet_id))
         await session.execute(delete(Wallet).where(Wallet.id == wallet_id))
         await session.commit()
+    forget_wallet(wallet_id)
+    unschedule_wallet(wallet_id)
     return True
 
 
@@ -258,23 +259,12 @@ async def custom_range_inflows_by_wallet(
     start_d: date, end_d: date
 ) -> tuple[float, list[tuple[Wallet, float]], float]:
     """
-    Поступления (CryptoFlow.price > 0) за [start_d, end_d] включительно.
+    Поступления (CryptoFlow.price > 0) за [start_d, end_d] включительно, по суточным итогам flow_daily.
     Возвращает (общая сумма, только кошельки с суммой поступлений > 0, порядок как в списке кошельков,
     сумма по wallet_id без записи в таблице wallet — редкий случай).
     """
-    start_dt = _day_boundary_datetime(start_d, end_of_day=False)
-    end_excl = _day_boundary_datetime(end_d, end_of_day=True)
     async with Session() as session:
-        result = await session.execute(
-            select(CryptoFlow.wallet_id, func.sum(CryptoFlow.price)).where(
-                CryptoFlow.price > 0,
-                CryptoFlow.time_created >= start_dt,
-                CryptoFlow.time_created < end_excl,
-            ).group_by(CryptoFlow.wallet_id)
-        )
-        by_id: dict[int, float] = {
-            wid: float(s or 0) for wid, s in result.all()
-        }
+        by_id: dict[int, float] = await inflows_by_wallet(session, start_d, end_d)
 
     total = sum(by_id.values())
     wallets = await load_wallets_sorted()
@@ -305,15 +295,20 @@ async def start_command(message: Message, state: FSMContext):
             )
             user = result.scalar_one_or_none()
 
-            if not user:
-                user = User(user_id=message.from_user.id)
-                session.add(user)
-                await session.commit()
-
-            if user.is_active:
-                await message.answer("Вы уже активированы!")
-            else:
-                await message.answer("Введите пароль для активации:")
+        if not user:
+            # Соединение записи одно на весь бот — занимаем его только на вставку
+            async with WriteSession() as session:
+                session.add(User(user_id=message.from_user.id))
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # Пользователя уже добавил параллельный /start
+                    await session.rollback()
+
+        if user and user.is_active:
+            await message.answer("Вы уже активированы!")
+        else:
+            await message.answer("Введите пароль для активации:")
 
 
 def _fmt_dd_mm_yy(d: date) -> str:
@@ -324,61 +319,20 @@ def _fmt_dd_mm_yy(d: date) -> str:
 async def show_stats(message: Message, state: FSMContext):
     await state.clear()
     async with Session() as session:
-        now = datetime.utcnow()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(hours=3)
-        week_start = now - timedelta(days=now.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(hours=3)
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(hours=3)
-
-        first_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if first_of_month.month == 1:
-            prev_cal = datetime(first_of_month.year - 1, 12, 1, 0, 0, 0)
-        else:
-            prev_cal = datetime(first_of_month.year, first_of_month.month - 1, 1, 0, 0, 0)
-        prev_month_start = prev_cal - timedelta(hours=3)
-
-        q_day = session.execute(
-            select(func.sum(CryptoFlow.price)).where(
-                CryptoFlow.price > 0,
-                CryptoFlow.time_created >= today_start,
-            )
-        )
-        q_week = session.execute(
-            select(func.sum(CryptoFlow.price)).where(
-                CryptoFlow.price > 0,
-                CryptoFlow.time_created >= week_start,
-            )
-        )
-        q_month = session.execute(
-            select(func.sum(CryptoFlow.price)).where(
-                CryptoFlow.price > 0,
-                CryptoFlow.time_created >= month_start,
-            )
-        )
-        q_prev_month = session.execute(
-            select(func.sum(CryptoFlow.price)).where(
-                CryptoFlow.price > 0,
-                CryptoFlow.time_created >= prev_month_start,
-                CryptoFlow.time_created < month_start,
-            )
-        )
-        q_all = session.execute(
-            select(func.sum(CryptoFlow.price)).where(CryptoFlow.price > 0)
-        )
-
-        rows = [
-            ("сутки", q_day),
-            ("неделю", q_week),
-            ("месяц", q_month),
-            ("прошлый месяц", q_prev_month),
-            ("все время", q_all),
-        ]
+        totals = await flow_totals(session)
+
+    periods = [
+        ("сутки", "day"),
+        ("неделю", "week"),
+        ("месяц", "month"),
+        ("прошлый месяц", "prev_month"),
+        ("все время", "all"),
+    ]
 
-        stats_text = "📊 Статистика поступлений:\n\n"
-        for period, query in rows:
-            result = await query
-            total = result.scalar() or 0
-            stats_text += f"За {period}: {total:.2f} $\n"
+    stats_text = "📊 Статистика поступлений:\n\n"
+    for period, key in periods:
+        inflow, _ = totals[key]
+        stats_text += f"За {period}: {inflow:.2f} $\n"
 
     await message.answer(
         stats_text,
@@ -386,6 +340,12 @@ async def show_stats(message: Message, state: FSMContext):
     )
 
 
+@router.message(Command("metrics"), F.from_user.id.in_(ADMIN_IDS))
+async def show_metrics(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer(f"📈 Метрики проверки:\n\n{metrics_summary()}")
+
+
 @router.message(F.text == "💼 Кошельки", F.from_user.id.in_(ADMIN_IDS))
 async def show_wallets_panel(message: Message, state: FSMContext):
     await state.clear()
@@ -579,14 +539,21 @@ async def add_wallet_finish(message: Message, state: FSMContext):
         address, token = message.text.split()
         token = token.lower()
 
-        if token not in ["btc", "eth", "ton", "tron"]:
+        if token not in CHAINS:
             await message.answer(
-                "Неверный токен. Допустимые: btc, eth, ton, tron",
+                f"Неверный токен. Допустимые: {', '.join(CHAINS)}",
                 reply_markup=get_admin_keyboard(),
             )
             return
 
-        async with Session() as session:
+        if not CHAINS[token].validate_address(address):
+            await message.answer(
+                f"Адрес не похож на адрес сети {token}. Проверьте и добавьте кошелек заново.",
+                reply_markup=get_admin_keyboard(),
+            )
+            return
+
+        async with WriteSession() as session:
             wallet = Wallet(address=address, token=token)
             session.add(wallet)
             try:
@@ -631,10 +598,16 @@ async def handle_password(message: Message):
         )
         user = result.scalar_one_or_none()
 
-        if user and not user.is_active:
-            if message.text == USER_PASS:
-                user.is_active = True
-                await session.commit()
-                await message.answer("Пароль верный! Вы активированы.")
-            else:
-                await message.answer("Неверный пароль. Попробуйте еще раз.")
+    if not user or user.is_active:
+        return
+    if message.text != USER_PASS:
+        await message.answer("Неверный пароль. Попробуйте еще раз.")
+        return
+
+    # Соединение записи занимается только на UPDATE, ответ уходит после коммита
+    async with WriteSession() as session:
+        await session.execute(
+            update(User).where(User.user_id == message.from_user.id).values(is_active=True)
+        )
+        await session.commit()
+    await message.answer("Пароль верный! Вы активированы.")
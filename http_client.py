@@ -0,0 +1,48 @@
+from typing import Optional
+
+import aiohttp
+
+from config import (
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+)
+
+# Один пул keep-alive соединений на всё приложение: TLS-рукопожатие с провайдером
+# выполняется один раз, а не на каждый кошелек
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def init_http_session() -> aiohttp.ClientSession:
+    """Создает общую HTTP-сессию (вызывается один раз при старте)."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            headers={"User-Agent": "CryptoChecker/1.0"},
+        )
+    return _session
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию, созданную в init_http_session."""
+    if _session is None or _session.closed:
+        raise RuntimeError("HTTP-сессия не инициализирована: вызовите init_http_session()")
+    return _session
+
+
+async def close_http_session() -> None:
+    """Закрывает общую HTTP-сессию и её пул соединений."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -4,9 +4,15 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram import Dispatcher
 
 import handlers
-from balance_checker import periodic_balance_check
+from balance_checker import run_balance_scheduler
 from bot import bot, notify_signal
+from broadcast import outbox_worker
+from retention import run_retention
+from balance_cache import warm_balance_cache
+from price_cache import warm_price_cache
 from db.models import create_tables
+from http_client import init_http_session, close_http_session
+from metrics import start_metrics_server, stop_metrics_server
 from typing import NoReturn
 
 
@@ -22,7 +28,7 @@ async def main() -> None:
     Основная функция запуска бота
 
     Эта функция:
-    1. Инициализирует таблицы в базе данных
+    1. Инициализирует таблицы в базе данных и общий HTTP-клиент
     2. Настраивает логирование
     3. Регистрирует обработчики сообщений
     4. Запускает бота в режиме long-polling
@@ -36,7 +42,8 @@ async def main() -> None:
     6. Запуск опроса серверов Telegram
 
     Обработка ошибок:
-        Ловит и логирует все исключения во время работы
+        Ловит и логирует все исключения во время работы,
+        при завершении закрывает пул HTTP-соединений
     """
     try:
         # Инициализация таблиц в базе данных
@@ -44,7 +51,22 @@ async def main() -> None:
         # Настройка базового логирования
         logger.info("Инициализация таблиц базы данных завершена")
 
-        asyncio.create_task(periodic_balance_check())
+        # Последние балансы кошельков для поиска изменений без запросов к истории
+        await warm_balance_cache()
+        # Последние сохраненные курсы — запасное значение, пока CoinGecko не ответил
+        await warm_price_cache()
+
+        # Общий пул HTTP-соединений для опроса балансов и курсов
+        await init_http_session()
+        # Эндпоинт /metrics для Prometheus (METRICS_PORT=0 — выключен)
+        await start_metrics_server()
+
+        # Проверка балансов: у каждого кошелька свой срок, сводки — раз в REPORT_INTERVAL
+        asyncio.create_task(run_balance_scheduler())
+        # Фоновая отправка очереди сообщений (отчеты и сигналы)
+        asyncio.create_task(outbox_worker())
+        # Прореживание старых снимков balance с архивом удаленных строк
+        asyncio.create_task(run_retention())
 
         # Создание диспетчера с хранилищем состояний
         storage = MemoryStorage()
@@ -67,6 +89,9 @@ async def main() -> None:
     except Exception as e:
         logger.exception(f"Критическая ошибка: {str(e)}")
         raise
+    finally:
+        await close_http_session()
+        await stop_metrics_server()
 
 
 def run_app() -> NoReturn:
@@ -0,0 +1,233 @@
+"""
+Метрики процесса: счетчики, значения и гистограммы в памяти с выдачей в текстовом
+формате Prometheus (GET /metrics на METRICS_HOST:METRICS_PORT) и краткой сводкой
+для администратора (команда /metrics).
+
+Модуль ничего не импортирует из бота — метрики объявлены здесь, а замеры делаются
+в местах вызова.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list["_Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    """Только растущее значение: число запросов, ошибок, проверенных кошельков."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(_Metric):
+    """Текущее значение; set_function — вычислять при каждом чтении (длина очереди)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self.values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        if self._function is not None:
+            return [f"{self.name} {self.value()}"]
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in self.values.items()]
+
+
+class Histogram(_Metric):
+    """Распределение длительностей в секундах по корзинам buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счетчики по корзинам, сумма, количество]
+        self.values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер блока кода: with HISTOGRAM.time(phase="fetch"): ..."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Оценка квантиля по корзинам: верхняя граница корзины, где набирается доля q."""
+        state = self.values.get(self._key(labels))
+        if not state or not state[2]:
+            return None
+        target = q * state[2]
+        cumulative = 0
+        for bound, count in zip(self.buckets, state[0]):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+PROVIDER_LATENCY = Histogram(
+    "provider_request_seconds", "Длительность запроса к API провайдера", ("provider",)
+)
+PROVIDER_ERRORS = Counter("provider_errors_total", "Ошибки запросов к провайдерам", ("provider",))
+PROVIDER_THROTTLED = Counter("provider_throttled_total", "Ответы 429 от провайдеров", ("provider",))
+CHECK_PHASE = Histogram(
+    "check_phase_seconds", "Длительность этапов проверки: prices, transfers, fetch, persist, notify", ("phase",)
+)
+WALLETS_CHECKED = Counter("wallets_checked_total", "Проверенные кошельки", ("chain",))
+WALLETS_SKIPPED = Counter("wallets_skipped_total", "Кошельки без баланса после проверки (ошибка API)", ("chain",))
+SCHEDULER_QUEUE = Gauge("scheduler_queue_size", "Кошельков в очереди проверок")
+SCHEDULER_OVERDUE = Gauge("scheduler_overdue", "Кошельков с наступившим сроком проверки")
+OUTBOX_PENDING = Gauge("outbox_pending", "Сообщений в очереди на отправку (по последней выборке)")
+BROADCAST_DURATION = Histogram("broadcast_seconds", "Длительность отправки пачки очереди в Telegram")
+TELEGRAM_MESSAGES = Counter("telegram_messages_total", "Сообщения рассылки по результату", ("result",))
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def summary() -> str:
+    """Краткая сводка для администратора: средние и p95 задержек, ошибки, очереди."""
+    lines = ["Этапы проверки (среднее / p95, с):"]
+    for (phase,), (_, total, count) in sorted(CHECK_PHASE.values.items()):
+        p95 = CHECK_PHASE.quantile(0.95, phase=phase)
+        lines.append(f"  {phase}: {total / count:.2f} / {p95} ({count})")
+
+    lines.append("Провайдеры (среднее, с / ошибки / 429):")
+    for (provider,), (_, total, count) in sorted(PROVIDER_LATENCY.values.items()):
+        errors = int(PROVIDER_ERRORS.values.get((provider,), 0))
+        throttled = int(PROVIDER_THROTTLED.values.get((provider,), 0))
+        lines.append(f"  {provider}: {total / count:.2f} / {errors} / {throttled}")
+
+    checked = int(sum(WALLETS_CHECKED.values.values()))
+    skipped = int(sum(WALLETS_SKIPPED.values.values()))
+    lines.append(f"Проверено кошельков: {checked}, без баланса: {skipped}")
+    lines.append(
+        f"Очередь проверок: {int(SCHEDULER_QUEUE.value())}, просрочено: {int(SCHEDULER_OVERDUE.value())}; "
+        f"очередь сообщений: {int(OUTBOX_PENDING.value())}"
+    )
+    return "\n".join(lines)
+
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server() -> None:
+    """
+    HTTP-эндпоинт /metrics для Prometheus; METRICS_PORT=0 — не запускать.
+    Занятый порт не мешает работе бота: метрики остаются доступны командой /metrics.
+    """
+    global _runner
+    if not METRICS_PORT or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        print(f"Эндпоинт метрик не запущен ({METRICS_HOST}:{METRICS_PORT}): {e}")
+        await runner.cleanup()
+        return
+    _runner = runner
+
+
+async def stop_metrics_server() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, insert, update, delete, or_
+
+from config import SIGNAL, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX
+from db.models import WriteSession, Session, OutboxMessage
+
+# Ограничение Telegram на длину сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def enqueue_signal(text: str, detail: Optional[str] = None) -> None:
+    """Ставит служебный сигнал в очередь; сигналы с одинаковым текстом сводятся в один."""
+    if SIGNAL is None:
+        return
+    async with WriteSession() as session:
+        session.add(OutboxMessage(kind="signal", chat_id=SIGNAL, text=text, detail=detail))
+        await session.commit()
+
+
+async def enqueue_broadcast(text: str, recipients: dict[int, bool]) -> None:
+    """Ставит отчет в очередь для каждого получателя: chat_id -> нужна ли клавиатура администратора."""
+    if not recipients:
+        return
+    async with WriteSession() as session:
+        await session.execute(insert(OutboxMessage), [
+            {"kind": "message", "chat_id": chat_id, "text": text, "with_keyboard": with_keyboard}
+            for chat_id, with_keyboard in recipients.items()
+        ])
+        await session.commit()
+
+
+async def fetch_pending(limit: int = OUTBOX_BATCH_SIZE) -> list[OutboxMessage]:
+    """Самые старые сообщения очереди, срок отправки которых наступил."""
+    async with Session() as session:
+        result = await session.execute(
+            select(OutboxMessage)
+            .where(or_(OutboxMessage.next_attempt_at.is_(None), OutboxMessage.next_attempt_at <= datetime.utcnow()))
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+async def complete(ids: list[int]) -> None:
+    """Удаляет отправленные (или безнадежные) сообщения."""
+    if not ids:
+        return
+    async with WriteSession() as session:
+        await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(ids)))
+        await session.commit()
+
+
+async def postpone(rows: list[OutboxMessage], counted: bool = True) -> None:
+    """
+    Откладывает неотправленные сообщения с экспоненциальной отсрочкой. counted — неудача
+    по вине сообщения: засчитывается попытка, исчерпавшие OUTBOX_MAX_ATTEMPTS удаляются.
+    Недоступность Telegram (counted=False) только откладывает отправку.
+    """
+    if not rows:
+        return
+    now = datetime.utcnow()
+    values = []
+    for row in rows:
+        retries = (row.retries or 0) + 1
+        delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (retries - 1))
+        values.append({
+            "id": row.id,
+            "attempts": (row.attempts or 0) + (1 if counted else 0),
+            "retries": retries,
+            "next_attempt_at": now + timedelta(seconds=delay),
+        })
+    async with WriteSession() as session:
+        await session.execute(update(OutboxMessage), values)
+        if counted:
+            await session.execute(
+                delete(OutboxMessage).where(
+                    OutboxMessage.id.in_([row.id for row in rows]),
+                    OutboxMessage.attempts >= OUTBOX_MAX_ATTEMPTS,
+                )
+            )
+        await session.commit()
+
+
+def format_digest(text: str, details: list[Optional[str]]) -> str:
+    """Один сигнал вместо нескольких одинаковых: общий текст и список деталей (адресов)."""
+    details = [detail for detail in details if detail]
+    if len(details) <= 1:
+        message = f"{details[0]} - {text}" if details else text
+        return message[:MAX_MESSAGE_LENGTH]
+
+    lines = [text, f"Повторов: {len(details)}"]
+    length = sum(len(line) + 1 for line in lines)
+    for shown, detail in enumerate(details):
+        tail = f"… и ещё {len(details) - shown}"
+        if length + len(detail) + 1 + len(tail) > MAX_MESSAGE_LENGTH:
+            lines.append(tail)
+            break
+        lines.append(detail)
+        length += len(detail) + 1
+    return "\n".join(lines)
+
+
+def coalesce_signals(rows: list[OutboxMessage]) -> list[tuple[int, str, list[int]]]:
+    """Группирует сигналы по (chat_id, text): [(chat_id, текст сводки, id строк очереди)]."""
+    groups: dict[tuple[int, str], list[OutboxMessage]] = defaultdict(list)
+    for row in rows:
+        groups[(row.chat_id, row.text)].append(row)
+    return [
+        (chat_id, format_digest(text, [row.detail for row in group]), [row.id for row in group])
+        for (chat_id, text), group in groups.items()
+    ]
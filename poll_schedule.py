@@ -0,0 +1,203 @@
+import heapq
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func
+
+from balance_cache import get_last_balance
+from chains import CHAINS
+from config import (
+    POLL_INCREMENTAL,
+    POLL_JITTER,
+    SCHEDULER_STARTUP_SPREAD,
+    POLL_HOT_INTERVAL,
+    POLL_WARM_INTERVAL,
+    POLL_COLD_INTERVAL,
+    POLL_MAX_STALENESS,
+    POLL_HOT_WINDOW,
+    POLL_WARM_WINDOW,
+    POLL_LARGE_BALANCE_USD,
+)
+from db.models import Session, FlowDaily, Wallet
+from metrics import SCHEDULER_OVERDUE, SCHEDULER_QUEUE
+from stats import MSK_OFFSET
+
+# Когда у кошелька было последнее движение (UTC)
+_last_flow: dict[int, datetime] = {}
+_warmed = False
+
+# Очередь проверок: куча (срок по time.monotonic, порядковый номер, wallet_id).
+# Действителен только срок из _due — перенос срока не ищет старую запись в куче,
+# она пропускается при извлечении. Кошелек в работе есть в _wallets, но не в _due
+_queue: list[tuple[float, int, int]] = []
+_due: dict[int, float] = {}
+_wallets: dict[int, Wallet] = {}
+# Окно добора пачки (с): кошельки той же сети со сроком в пределах окна первого
+# забираются вместе с ним. POLL_JITTER × интервал, у новых — SCHEDULER_STARTUP_SPREAD
+_windows: dict[int, float] = {}
+_sequence = 0
+
+SCHEDULER_QUEUE.set_function(lambda: len(_due))
+SCHEDULER_OVERDUE.set_function(lambda: sum(1 for due in _due.values() if due <= time.monotonic()))
+
+
+async def warm_poll_schedule() -> None:
+    """
+    Загружает день последнего движения каждого кошелька из flow_daily одним запросом.
+    Точное время внутри дня неизвестно — берется начало московских суток.
+    """
+    global _warmed
+    if _warmed:
+        return
+
+    async with Session() as session:
+        result = await session.execute(
+            select(FlowDaily.wallet_id, func.max(FlowDaily.day)).group_by(FlowDaily.wallet_id)
+        )
+        rows = result.all()
+
+    for wallet_id, day in rows:
+        _last_flow.setdefault(wallet_id, datetime.combine(day, datetime.min.time()) - MSK_OFFSET)
+    _warmed = True
+
+
+def poll_interval(wallet_id: int, balance_usd: Optional[float], now: datetime) -> timedelta:
+    """Как часто проверять кошелек: по давности последнего движения и размеру баланса."""
+    if not POLL_INCREMENTAL:
+        return timedelta(seconds=POLL_HOT_INTERVAL)
+
+    last_flow = _last_flow.get(wallet_id)
+    idle = now - last_flow if last_flow is not None else None
+
+    if idle is not None and idle <= timedelta(hours=POLL_HOT_WINDOW):
+        seconds = POLL_HOT_INTERVAL
+    elif (idle is not None and idle <= timedelta(hours=POLL_WARM_WINDOW)) or (
+        balance_usd is not None and balance_usd >= POLL_LARGE_BALANCE_USD
+    ):
+        seconds = POLL_WARM_INTERVAL
+    else:
+        seconds = POLL_COLD_INTERVAL
+    return timedelta(seconds=min(seconds, POLL_MAX_STALENESS))
+
+
+def record_flow(wallet_id: int, moment: datetime) -> None:
+    """Движение по кошельку делает его «горячим» — он снова проверяется часто."""
+    _last_flow[wallet_id] = max(moment, _last_flow.get(wallet_id, moment))
+
+
+def schedule_wallet(wallet: Wallet, delay: float, interval: Optional[float] = None) -> None:
+    """
+    Ставит проверку кошелька через delay секунд (прежний срок, если был, отменяется).
+    interval — обычный интервал кошелька, от него окно добора пачки; без него (новый
+    кошелек) окно — весь разброс старта SCHEDULER_STARTUP_SPREAD.
+    """
+    global _sequence
+    _sequence += 1
+    due = time.monotonic() + delay
+    _wallets[wallet.id] = wallet
+    _windows[wallet.id] = POLL_JITTER * interval if interval is not None else SCHEDULER_STARTUP_SPREAD
+    _due[wallet.id] = due
+    heapq.heappush(_queue, (due, _sequence, wallet.id))
+
+
+def reschedule_wallets(wallets, now: datetime) -> None:
+    """
+    Следующая проверка пачки после только что завершенной: через интервал каждого кошелька,
+    укороченный на случайную долю до POLL_JITTER — одну на всю пачку. Пачки разных сетей
+    расходятся во времени, а кошельки одной пачки остаются вместе и снова уйдут одним
+    запросом. Случайный сдвиг пачек друг относительно друга со временем сводит их в окно
+    добора — разбитые группы кошельков сливаются.
+    Удаленный за время проверки кошелек в очередь не возвращается.
+    """
+    jitter = random.uniform(0, POLL_JITTER)
+    for wallet in wallets:
+        if wallet.id not in _wallets:
+            continue
+        previous = get_last_balance(wallet.id)
+        interval = poll_interval(wallet.id, previous[2] if previous is not None else None, now).total_seconds()
+        schedule_wallet(wallet, interval * (1 - jitter), interval)
+
+
+def sync_wallets(wallets) -> None:
+    """
+    Сверяет очередь со списком кошельков из БД: новые ставятся в очередь вразброс
+    в пределах SCHEDULER_STARTUP_SPREAD секунд, удаленные убираются. Объекты уже
+    стоящих в очереди кошельков не заменяются: в них после проверок хранятся курсор
+    переводов и время проверки, а в свежих из БД они могут быть старше.
+    """
+    current = {wallet.id: wallet for wallet in wallets}
+    for wallet_id in list(_wallets):
+        if wallet_id not in current:
+            unschedule_wallet(wallet_id)
+    for wallet_id, wallet in current.items():
+        if wallet_id not in _wallets:
+            schedule_wallet(wallet, random.uniform(0, SCHEDULER_STARTUP_SPREAD))
+
+
+def scheduled_wallets() -> list[Wallet]:
+    return list(_wallets.values())
+
+
+def _pop_valid() -> Optional[tuple[float, int]]:
+    while _queue:
+        due, _, wallet_id = heapq.heappop(_queue)
+        if _due.get(wallet_id) == due:
+            return due, wallet_id
+    return None
+
+
+def seconds_until_due() -> Optional[float]:
+    """Сколько ждать ближайшей проверки; None — очередь пуста."""
+    while _queue and _due.get(_queue[0][2]) != _queue[0][0]:
+        heapq.heappop(_queue)
+    if not _queue:
+        return None
+    return max(0.0, _queue[0][0] - time.monotonic())
+
+
+def take_due_wallets() -> list[Wallet]:
+    """
+    Забирает из очереди кошелек с наступившим сроком и вместе с ним — кошельки той же сети,
+    чей срок наступит в пределах их окна (POLL_JITTER × интервал), до batch_size её backend,
+    чтобы они ушли одним запросом. Проверка раньше срока не выходит за пределы, которые
+    джиттер и так допускает.
+    Забранные кошельки не в очереди, пока их не вернет reschedule_wallets.
+    """
+    now = time.monotonic()
+    if seconds_until_due() is None or _queue[0][0] > now:
+        return []
+
+    _, first_id = _pop_valid()
+    token = _wallets[first_id].token
+    batch_size = CHAINS[token].batch_size if token in CHAINS else 1
+    # Дальше самого широкого окна в куче искать нечего
+    horizon = now + max(SCHEDULER_STARTUP_SPREAD, POLL_JITTER * POLL_MAX_STALENESS)
+    batch = [first_id]
+    skipped = []
+    while len(batch) < batch_size and _queue and _queue[0][0] <= horizon:
+        entry = _pop_valid()
+        if entry is None:
+            break
+        if entry[0] > horizon:
+            skipped.append(entry)
+            break
+        if _wallets[entry[1]].token == token and entry[0] - _windows[entry[1]] <= now:
+            batch.append(entry[1])
+        else:
+            skipped.append(entry)
+
+    for due, wallet_id in skipped:
+        heapq.heappush(_queue, (due, 0, wallet_id))
+    for wallet_id in batch:
+        del _due[wallet_id]
+    return [_wallets[wallet_id] for wallet_id in batch]
+
+
+def unschedule_wallet(wallet_id: int) -> None:
+    """Убирает удаленный кошелек из очереди; новый кошелек с тем же id начнет с чистого листа."""
+    _last_flow.pop(wallet_id, None)
+    _due.pop(wallet_id, None)
+    _wallets.pop(wallet_id, None)
+    _windows.pop(wallet_id, None)
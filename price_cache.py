@@ -0,0 +1,188 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+import aiohttp
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from bot import notify_signal
+from chains import CHAINS
+from config import API_BASE_URLS, COINGECKO_DEMO_API_KEY, PRICE_TTL, PRICE_MAX_STALE
+from db.models import Session, WriteSession, Currency
+from http_client import get_http_session
+from price_history import add_price_points
+from rate_limiter import RateLimitedError, provider_limiter, raise_if_throttled
+
+
+COINGECKO_SIMPLE_PRICE = f"{API_BASE_URLS['coingecko']}/api/v3/simple/price"
+
+
+async def fetch_coingecko_usd_prices(gecko_ids: tuple[str, ...]) -> dict[str, float]:
+    """
+    Один запрос CoinGecko simple/price для всех id (меньше риск 429, чем по одной монете).
+    Ключи результата — те же id, что в CoinGecko (bitcoin, tether, ...).
+    """
+    unique_ids = tuple(dict.fromkeys(gecko_ids))
+    if not unique_ids:
+        return {}
+
+    headers = {"Accept": "application/json"}
+    if COINGECKO_DEMO_API_KEY:
+        headers["x-cg-demo-api-key"] = COINGECKO_DEMO_API_KEY
+
+    params = {
+        "ids": ",".join(unique_ids),
+        "vs_currencies": "usd",
+    }
+
+    try:
+        # Общий лимитер CoinGecko: скорость подстраивается под ответы 429 и Retry-After
+        async with provider_limiter("coingecko"), get_http_session().get(
+            COINGECKO_SIMPLE_PRICE,
+            params=params,
+            headers=headers,
+        ) as response:
+            raise_if_throttled(response)
+            if response.status != 200:
+                body = await response.text()
+                print(f"CoinGecko HTTP {response.status}: {body[:500]}")
+                return {}
+            data = await response.json(content_type=None)
+        if not isinstance(data, dict):
+            print(f"CoinGecko: неожиданный ответ {data!r}")
+            return {}
+        if "error" in data or (
+            isinstance(data.get("status"), dict) and data["status"].get("error_code")
+        ):
+            print(f"CoinGecko API error: {data}")
+            return {}
+
+        out: dict[str, float] = {}
+        for gid in unique_ids:
+            block = data.get(gid)
+            if isinstance(block, dict) and block.get("usd") is not None:
+                out[gid] = float(block["usd"])
+        return out
+    except (aiohttp.ClientError, asyncio.TimeoutError, RateLimitedError, TypeError, ValueError) as e:
+        print(f"CoinGecko: {e}")
+        return {}
+
+
+# Последний известный курс каждой сети: token -> (usd, время получения по time.monotonic).
+# Прогревается из таблицы currency один раз, дальше обновляется запросами к CoinGecko.
+# Время -inf — курс из БД неизвестной давности: его можно отдать, но обновить нужно сразу.
+_prices: dict[str, tuple[float, float]] = {}
+_warmed = False
+_refresh_task: Optional[asyncio.Task] = None
+_last_attempt = float("-inf")
+# Первое обновление после запуска завершено (успешно или нет): дальше курсы не ждем
+_first_refresh_done = False
+
+
+async def warm_price_cache() -> None:
+    """Загружает сохраненные курсы одним запросом, чтобы после перезапуска было что отдать."""
+    global _warmed
+    if _warmed:
+        return
+
+    async with Session() as session:
+        result = await session.execute(select(Currency.coin, Currency.currency))
+        rows = result.all()
+
+    for coin, usd in rows:
+        _prices.setdefault(coin, (usd, float("-inf")))
+    _warmed = True
+
+
+async def refresh_prices() -> dict[str, float]:
+    """
+    Один запрос CoinGecko для всех сетей и одна транзакция: полученные курсы
+    перезаписываются в currency и дописываются в price_history.
+    Сети без курса сохраняют прежнее значение из кэша.
+    """
+    global _last_attempt, _first_refresh_done
+    _last_attempt = time.monotonic()
+
+    currency_mapping = {token: backend.gecko_id for token, backend in CHAINS.items()}
+    try:
+        gecko_prices = await fetch_coingecko_usd_prices(tuple(currency_mapping.values()))
+    finally:
+        _first_refresh_done = True
+    fetched_at = time.monotonic()
+
+    fresh: dict[str, float] = {}
+    for coin_name, gecko_id in currency_mapping.items():
+        price = gecko_prices.get(gecko_id)
+
+        fallback_price = CHAINS[coin_name].fallback_price
+        if price is None and fallback_price is not None:
+            # Стейблкоин ~ 1 USD; при лимитах CoinGecko не спамим алертом
+            price = fallback_price
+            print(f"CoinGecko: нет цены {gecko_id} — для {coin_name} используем {price} USD")
+
+        if price is None:
+            await notify_signal(f"Ошибка при получении курса {coin_name}")
+            continue
+        fresh[coin_name] = price
+
+    if fresh:
+        statement = insert(Currency).values([
+            {"coin": coin_name, "currency": price} for coin_name, price in fresh.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Currency.coin],
+            set_={"currency": statement.excluded.currency},
+        )
+        async with WriteSession() as session:
+            await session.execute(statement)
+            await add_price_points(session, fresh, datetime.utcnow())
+            await session.commit()
+
+        _prices.update({coin_name: (price, fetched_at) for coin_name, price in fresh.items()})
+
+    return fresh
+
+
+def _refresh_in_background() -> None:
+    """Запускает обновление курсов, если оно ещё не идет (один запрос на всех ожидающих)."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(refresh_prices())
+        _refresh_task.add_done_callback(_log_refresh_error)
+
+
+def _log_refresh_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Ошибка обновления курсов: {task.exception()}")
+
+
+async def get_prices() -> dict[str, float]:
+    """
+    Курсы всех сетей в USD: token -> usd.
+
+    Курсы моложе PRICE_TTL отдаются из кэша. Более старые тоже отдаются сразу, а обновление
+    идет в фоне (stale-while-revalidate): при недоступном CoinGecko проверка балансов не ждет
+    его таймаутов. Ждет только холодный старт — первое обновление после запуска, если у какой-то
+    сети курса нет совсем. CoinGecko запрашивается не чаще раза в PRICE_TTL; сеть без курса
+    получает 0.0.
+    """
+    await warm_price_cache()
+    now = time.monotonic()
+    oldest = max(now - _prices[token][1] if token in _prices else float("inf") for token in CHAINS)
+
+    if oldest >= PRICE_TTL and now - _last_attempt >= PRICE_TTL:
+        if PRICE_MAX_STALE <= oldest < float("inf"):
+            print(f"Курсы не обновлялись {oldest:.0f} с — используем последние известные")
+        _refresh_in_background()
+
+    cold = not _first_refresh_done and oldest == float("inf")
+    if cold and _refresh_task is not None and not _refresh_task.done():
+        try:
+            # shield: отмена ожидающего цикла не отменяет общее обновление
+            await asyncio.shield(_refresh_task)
+        except Exception:
+            pass
+
+    return {token: _prices[token][0] if token in _prices else 0.0 for token in CHAINS}
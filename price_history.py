@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, insert
+
+from db.models import PriceHistory
+
+
+async def add_price_points(session, prices: dict[str, float], moment: datetime) -> None:
+    """Дописывает курсы монет (coin -> usd) на момент moment (UTC); коммит — за вызывающим."""
+    if prices:
+        await session.execute(insert(PriceHistory), [
+            {"coin": coin, "time": moment, "usd": usd} for coin, usd in prices.items()
+        ])
+
+
+def price_at_query(coin: str, moment: datetime):
+    """Последний курс монеты не позже moment: один переход по индексу (coin, time)."""
+    return (
+        select(PriceHistory.usd)
+        .where(PriceHistory.coin == coin, PriceHistory.time <= moment)
+        .order_by(PriceHistory.time.desc())
+        .limit(1)
+    )
+
+
+async def price_at(session, coin: str, moment: datetime) -> Optional[float]:
+    """Курс монеты в USD, действовавший на момент moment (UTC), или None, если курсов раньше нет."""
+    result = await session.execute(price_at_query(coin, moment))
+    return result.scalar_one_or_none()
+
+
+async def price_range(session, coin: str, start: datetime, end: datetime) -> list[tuple[datetime, float]]:
+    """
+    Ряд курсов монеты за [start, end) по возрастанию времени, начиная с курса,
+    действовавшего на start, — чтобы любой момент периода можно было оценить.
+    """
+    starting = await price_at(session, coin, start)
+    result = await session.execute(
+        select(PriceHistory.time, PriceHistory.usd)
+        .where(PriceHistory.coin == coin, PriceHistory.time >= start, PriceHistory.time < end)
+        .order_by(PriceHistory.time)
+    )
+    points = [(moment, usd) for moment, usd in result.all()]
+    if starting is not None and (not points or points[0][0] > start):
+        points.insert(0, (start, starting))
+    return points
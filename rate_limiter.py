@@ -0,0 +1,155 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from config import (
+    PROVIDER_LIMITS,
+    RATE_INCREASE,
+    RATE_DECREASE_FACTOR,
+    RATE_MIN_FRACTION,
+    RATE_DEFAULT_PAUSE,
+)
+from metrics import PROVIDER_ERRORS, PROVIDER_LATENCY, PROVIDER_THROTTLED
+
+
+class RateLimitedError(Exception):
+    """Провайдер ответил 429 (Too Many Requests); retry_after — пауза из Retry-After, если была."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP 429, Retry-After: {retry_after}")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: заголовок бывает числом секунд или HTTP-датой."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def raise_if_throttled(response) -> None:
+    """Вызывается первым делом после ответа провайдера, чтобы лимитер увидел 429."""
+    if response.status == 429:
+        raise RateLimitedError(parse_retry_after(response.headers.get("Retry-After")))
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов к одному провайдеру: не больше `concurrency`
+    одновременных запросов и не чаще `rps` запросов в секунду (token bucket).
+    Используется как асинхронный контекстный менеджер вокруг HTTP-вызова.
+
+    С `max_rps` скорость подстраивается (AIMD): каждый успешный запрос немного
+    поднимает её к max_rps, а RateLimitedError внутри блока снижает в разы
+    и приостанавливает все запросы провайдера на Retry-After.
+
+    С `name` длительность запросов (без ожидания в лимитере), ошибки и 429
+    попадают в метрики провайдера.
+    """
+
+    def __init__(self, concurrency: int, rps: float, max_rps: Optional[float] = None, name: Optional[str] = None):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+        self.adaptive = max_rps is not None
+        self.rate = rps
+        self.max_rate = max(rps, max_rps) if max_rps else rps
+        self.min_rate = rps * RATE_MIN_FRACTION
+        # Запас токенов позволяет сразу отправить до concurrency запросов после простоя
+        self._capacity = float(max(1, int(concurrency)))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._started: dict[asyncio.Task, float] = {}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _take_token(self) -> None:
+        if self.rate <= 0:
+            return
+        # Ожидающие встают в очередь на блокировке — токены выдаются по порядку
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self) -> None:
+        if self.adaptive and self.rate < self.max_rate:
+            # Аддитивный рост: при rate запросах в секунду — примерно +RATE_INCREASE за секунду
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE / self.rate)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else RATE_DEFAULT_PAUSE
+        if now < self._paused_until:
+            # 429 на запросы, ушедшие до паузы, — тот же эпизод: скорость уже снижена,
+            # иначе N одновременных ответов снижают её N раз подряд
+            self._paused_until = max(self._paused_until, now + pause)
+            return
+        self._refill(now)
+        if self.adaptive:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+        self._paused_until = now + pause
+        self._tokens = 0.0
+        print(f"Лимит провайдера: пауза {pause:.1f} с, скорость {self.rate:.2f} запросов/с")
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self._semaphore.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        if self.name:
+            self._started[asyncio.current_task()] = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._semaphore.release()
+        if self.name:
+            started = self._started.pop(asyncio.current_task(), None)
+            if started is not None:
+                PROVIDER_LATENCY.observe(time.monotonic() - started, provider=self.name)
+            if isinstance(exc, RateLimitedError):
+                PROVIDER_THROTTLED.inc(provider=self.name)
+            elif exc is not None and not isinstance(exc, asyncio.CancelledError):
+                PROVIDER_ERRORS.inc(provider=self.name)
+        if exc is None:
+            self.on_success()
+        elif isinstance(exc, RateLimitedError):
+            self.on_throttled(exc.retry_after)
+
+
+_provider_limiters: dict[str, RateLimiter] = {}
+
+
+def provider_limiter(name: str) -> RateLimiter:
+    """Общий лимитер провайдера из PROVIDER_LIMITS: один на хост API на весь процесс."""
+    if name not in _provider_limiters:
+        limits = PROVIDER_LIMITS.get(name, {"concurrency": 1, "rps": 1.0})
+        _provider_limiters[name] = RateLimiter(
+            limits["concurrency"], limits["rps"], limits.get("max_rps"), name=name
+        )
+    return _provider_limiters[name]
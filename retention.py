@@ -0,0 +1,165 @@
+"""
+Прореживание истории balance и обслуживание файла базы.
+
+Фоновая задача run_retention раз в RETENTION_INTERVAL_HOURS оставляет все снимки
+за RETENTION_RAW_DAYS дней, по последнему снимку кошелька в каждом часе до
+RETENTION_HOURLY_DAYS дней и по последнему в сутках дальше. Последний снимок
+кошелька не удаляется никогда. Удаленные строки сначала дописываются в
+RETENTION_ARCHIVE_DIR/balance-ГГГГММДД.jsonl.gz, затем удаляются пачками по
+RETENTION_BATCH_SIZE — каждая пачка отдельной короткой транзакцией, чтобы запись
+балансов и обработчики не ждали. После удаления освобождается часть страниц
+(PRAGMA incremental_vacuum) и обновляется статистика планировщика (PRAGMA optimize).
+
+Разовый запуск: python -m retention [--vacuum]
+--vacuum — полный VACUUM после прореживания: нужен один раз, чтобы на старой базе
+заработал auto_vacuum=INCREMENTAL; блокирует базу на время выполнения.
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete, func
+
+from config import (
+    RETENTION_ENABLED,
+    RETENTION_RAW_DAYS,
+    RETENTION_HOURLY_DAYS,
+    RETENTION_INTERVAL_HOURS,
+    RETENTION_BATCH_SIZE,
+    RETENTION_ARCHIVE_DIR,
+    RETENTION_VACUUM_PAGES,
+)
+from db.models import Session, WriteSession, Balance, write_engine
+
+# Длина префикса time_check ('ГГГГ-ММ-ДД ЧЧ:ММ:СС...'), задающая интервал прореживания
+HOUR_PREFIX = 13
+DAY_PREFIX = 10
+
+
+def _archive_path(now: datetime) -> str:
+    return os.path.join(RETENTION_ARCHIVE_DIR, f"balance-{now:%Y%m%d}.jsonl.gz")
+
+
+def _write_archive(path: str, rows: list[dict]) -> None:
+    # Режим «ab» дописывает новый gzip-поток — gzip.open читает файл целиком как один
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with gzip.open(path, "ab") as archive:
+        for row in rows:
+            archive.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode())
+
+
+async def _ids_to_remove(start: Optional[datetime], end: datetime, prefix: int, after_id: int) -> list[int]:
+    """
+    Следующая страница (до RETENTION_BATCH_SIZE id больше after_id) снимков в [start, end),
+    кроме последнего снимка кошелька в каждом интервале (час или сутки по префиксу
+    time_check) и последнего снимка кошелька вообще.
+    """
+    conditions = [Balance.time_check < end]
+    if start is not None:
+        conditions.append(Balance.time_check >= start)
+    bucket = func.substr(Balance.time_check, 1, prefix)
+
+    kept_in_bucket = select(func.max(Balance.id)).where(*conditions).group_by(Balance.wallet_id, bucket)
+    latest = select(func.max(Balance.id)).group_by(Balance.wallet_id)
+
+    async with Session() as session:
+        result = await session.execute(
+            select(Balance.id)
+            .where(
+                *conditions,
+                Balance.id > after_id,
+                Balance.id.not_in(kept_in_bucket),
+                Balance.id.not_in(latest),
+            )
+            .order_by(Balance.id)
+            .limit(RETENTION_BATCH_SIZE)
+        )
+        return list(result.scalars().all())
+
+
+async def _remove_batch(ids: list[int], archive_path: str) -> None:
+    async with Session() as session:
+        result = await session.execute(select(Balance).where(Balance.id.in_(ids)))
+        rows = [
+            {
+                "id": row.id,
+                "wallet_id": row.wallet_id,
+                "coin": row.coin,
+                "amount": row.amount,
+                "amount_raw": row.amount_raw,
+                "price": row.price,
+                "time_check": row.time_check,
+            }
+            for row in result.scalars().all()
+        ]
+
+    # Сначала архив, потом удаление: при сбое строка окажется в архиве дважды, но не потеряется
+    await asyncio.to_thread(_write_archive, archive_path, rows)
+    async with WriteSession() as session:
+        await session.execute(delete(Balance).where(Balance.id.in_(ids)))
+        await session.commit()
+
+
+async def maintain_database() -> None:
+    """Освобождает часть пустых страниц и обновляет статистику для планировщика запросов."""
+    async with write_engine.connect() as conn:
+        mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        if mode == 2:
+            await conn.exec_driver_sql(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES})")
+        await conn.exec_driver_sql("PRAGMA optimize")
+        await conn.commit()
+
+
+async def compact_balances(now: Optional[datetime] = None) -> int:
+    """Один проход прореживания; возвращает число удаленных (и заархивированных) снимков."""
+    # time_check пишется по локальному времени сервера (datetime.now)
+    now = now or datetime.now()
+    raw_cutoff = now - timedelta(days=RETENTION_RAW_DAYS)
+    hourly_cutoff = now - timedelta(days=RETENTION_HOURLY_DAYS)
+    archive_path = _archive_path(now)
+
+    removed = 0
+    for start, end, prefix in ((hourly_cutoff, raw_cutoff, HOUR_PREFIX), (None, hourly_cutoff, DAY_PREFIX)):
+        # Постранично по id: на большой истории список всех id не держится в памяти,
+        # каждая страница архивируется и удаляется до чтения следующей
+        after_id = 0
+        while ids := await _ids_to_remove(start, end, prefix, after_id):
+            await _remove_batch(ids, archive_path)
+            removed += len(ids)
+            after_id = ids[-1]
+            # Между пачками уступаем соединение записи циклу проверки
+            await asyncio.sleep(0.1)
+
+    await maintain_database()
+    print(f"Прореживание истории balance: удалено {removed} снимков")
+    return removed
+
+
+async def run_retention():
+    """Фоновое прореживание раз в RETENTION_INTERVAL_HOURS; ошибки не останавливают бота."""
+    if not RETENTION_ENABLED:
+        return
+    while True:
+        try:
+            await compact_balances()
+        except Exception as e:
+            print(f"Ошибка прореживания истории: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_HOURS * 3600)
+
+
+async def _main(vacuum: bool) -> None:
+    await compact_balances()
+    if vacuum:
+        async with write_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+    await write_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(_main("--vacuum" in sys.argv[1:]))
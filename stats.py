@@ -0,0 +1,136 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func, case, and_, true
+from sqlalchemy.dialects.sqlite import insert
+
+from db.models import FlowDaily
+
+# Статистика ведется по московским суткам
+MSK_OFFSET = timedelta(hours=3)
+
+
+def flow_day(moment: datetime) -> date:
+    """Московский календарный день для времени в UTC."""
+    return (moment + MSK_OFFSET).date()
+
+
+async def add_flows_to_rollup(session, flow_rows: list[dict]) -> None:
+    """
+    Добавляет записи CryptoFlow в суточные итоги flow_daily — каждую в день своего time_created.
+    Вызывается в той же транзакции, что и вставка CryptoFlow.
+    """
+    totals: dict[tuple[int, date], list[float]] = defaultdict(lambda: [0.0, 0.0])
+    for row in flow_rows:
+        key = (row["wallet_id"], flow_day(row["time_created"]))
+        if row["price"] > 0:
+            totals[key][0] += row["price"]
+        else:
+            totals[key][1] -= row["price"]
+
+    if not totals:
+        return
+
+    statement = insert(FlowDaily).values([
+        {"wallet_id": wallet_id, "day": day, "inflow": inflow, "outflow": outflow}
+        for (wallet_id, day), (inflow, outflow) in totals.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[FlowDaily.wallet_id, FlowDaily.day],
+        set_={
+            "inflow": FlowDaily.inflow + statement.excluded.inflow,
+            "outflow": FlowDaily.outflow + statement.excluded.outflow,
+        },
+    )
+    await session.execute(statement)
+
+
+def period_bounds(now: Optional[datetime] = None) -> dict[str, tuple[Optional[date], Optional[date]]]:
+    """
+    Периоды сводной статистики: имя -> (первый день, день после последнего) в московских сутках.
+    None — граница не ограничена. Сутки считаются от календарной даты UTC, как и раньше в show_stats.
+    """
+    today = (now or datetime.utcnow()).date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    if month_start.month == 1:
+        prev_month_start = date(month_start.year - 1, 12, 1)
+    else:
+        prev_month_start = date(month_start.year, month_start.month - 1, 1)
+
+    return {
+        "day": (today, None),
+        "week": (week_start, None),
+        "month": (month_start, None),
+        "prev_month": (prev_month_start, month_start),
+        "all": (None, None),
+    }
+
+
+def flow_totals_query(bounds: dict[str, tuple[Optional[date], Optional[date]]]):
+    """
+    Один SELECT на все периоды, по паре колонок (inflow, outflow) на период.
+    Периоды с границами считаются условной агрегацией только по дням начиная с самой
+    ранней границы (диапазон по индексу), неограниченные — простой суммой по flow_daily:
+    CASE на каждую строку всей таблицы обходится SQLite в разы дороже.
+    """
+    bounded = {name: edges for name, edges in bounds.items() if edges != (None, None)}
+    unbounded = [name for name in bounds if name not in bounded]
+
+    starts = [start_day for start_day, _ in bounded.values() if start_day is not None]
+    recent_columns = []
+    for name, (start_day, end_day) in bounded.items():
+        conditions = []
+        if start_day is not None:
+            conditions.append(FlowDaily.day >= start_day)
+        if end_day is not None:
+            conditions.append(FlowDaily.day < end_day)
+        for field in ("inflow", "outflow"):
+            value = case((and_(*conditions), getattr(FlowDaily, field)), else_=0.0)
+            recent_columns.append(func.coalesce(func.sum(value), 0.0).label(f"{name}_{field}"))
+
+    subqueries = []
+    if recent_columns:
+        recent = select(*recent_columns)
+        if len(starts) == len(bounded):
+            recent = recent.where(FlowDaily.day >= min(starts))
+        subqueries.append(recent.subquery("recent"))
+    if unbounded:
+        overall_columns = []
+        for name in unbounded:
+            for field in ("inflow", "outflow"):
+                value = func.coalesce(func.sum(getattr(FlowDaily, field)), 0.0)
+                overall_columns.append(value.label(f"{name}_{field}"))
+        subqueries.append(select(*overall_columns).subquery("overall"))
+
+    # Каждый подзапрос возвращает ровно одну строку — соединяем без условия
+    source = subqueries[0]
+    for subquery in subqueries[1:]:
+        source = source.join(subquery, true())
+    return select(*(column for subquery in subqueries for column in subquery.c)).select_from(source)
+
+
+async def flow_totals(session, now: Optional[datetime] = None) -> dict[str, tuple[float, float]]:
+    """
+    Поступления и выводы за сутки, неделю, месяц, прошлый месяц и всё время
+    одним запросом к flow_daily: имя периода -> (inflow, outflow).
+    """
+    bounds = period_bounds(now)
+    result = await session.execute(flow_totals_query(bounds))
+    row = result.one()._mapping
+    return {
+        name: (float(row[f"{name}_inflow"]), float(row[f"{name}_outflow"]))
+        for name in bounds
+    }
+
+
+async def inflows_by_wallet(session, start_day: date, end_day: date) -> dict[int, float]:
+    """Поступления по wallet_id за московские дни [start_day, end_day] включительно."""
+    result = await session.execute(
+        select(FlowDaily.wallet_id, func.sum(FlowDaily.inflow)).where(
+            FlowDaily.day >= start_day,
+            FlowDaily.day <= end_day,
+        ).group_by(FlowDaily.wallet_id)
+    )
+    return {wallet_id: float(total or 0) for wallet_id, total in result.all()}